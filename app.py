@@ -1,22 +1,51 @@
 # app.py
+import os
+import re
+import time
 import streamlit as st
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from queue import Queue
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 import pandas as pd
 import altair as alt
 from streamlit_autorefresh import st_autorefresh
 
+try:
+    # optional: evaluates chart transforms in-process so only the result is sent to the browser
+    import vegafusion  # noqa: F401
+    HAS_VEGAFUSION = True
+except Exception:
+    HAS_VEGAFUSION = False
+
 from opc_worker import OpcWorker, Request
 import db_pg
 
 ENDPOINT = "opc.tcp://localhost:4840/freeopcua/server/"
+_UTC = timezone.utc
 DB_TYPE = db_pg.ensure_db()
 
+# REACTORS_VEGAFUSION=0 keeps Altair's default JSON data transformer
+if HAS_VEGAFUSION and os.environ.get("REACTORS_VEGAFUSION", "1") != "0":
+    alt.data_transformers.enable("vegafusion")
+
 METHOD_LABELS = ["manual", "timer", "on_boundaries", "pid"]
 METHOD_TO_INT = {"manual": 0, "timer": 1, "on_boundaries": 2, "pid": 3}
 
+# Keep calibration practical: only (ph, do) channels + biomass channels selectable
+CAL_SENSOR_GROUPS = frozenset({"ph", "do", "biomass"})
+
+# Sample tags are "<reactor>:<name>:<channel>", e.g. "R0:biomass:415"
+TAG_RE = re.compile(r"([^:]+):([^:]+):(.+)")
+BIOMASS_PREFERENCE = ["415", "445", "480", "515", "555", "590", "630", "680", "nir", "clear"]
+
+# Stage 2 plots are ~600 px wide; samples are averaged into this many time buckets per tag
+PLOT_BUCKETS = 600
+# hard cap on rows fetched for the four panels combined (newest rows win)
+MAX_PLOT_POINTS = 5000
+# run_every timers fire slightly early or late; this much early still counts as a full interval
+AUTO_SLACK_S = 0.25
+
 
 # -------------------------
 # Worker RPC helpers
@@ -31,8 +60,21 @@ def rpc_connect_browse(worker: OpcWorker, timeout: float = 25.0):
     return _rpc(worker, "connect_browse", payload=None, timeout=timeout)
 
 
-def rpc_read_snapshot(worker: OpcWorker, timeout: float = 10.0):
-    return _rpc(worker, "read_snapshot", payload=None, timeout=timeout)
+def rpc_bulk(worker: OpcWorker, ops: List[str], timeout: float = 25.0):
+    return _rpc(worker, "bulk", payload={"ops": list(ops)}, timeout=timeout)
+
+
+def rpc_read_snapshot(worker: OpcWorker, timeout: float = 10.0, since: Optional[Tuple[int, int]] = None):
+    # latest_values is kept current by the worker's subscriptions and guarded by its lock,
+    # so it is read in place instead of queueing behind connect/write/call requests.
+    # `timeout` is kept for callers; there is no round-trip to wait on.
+    # With `since` (a version this session already holds) only the changed nodes come back.
+    if since is not None:
+        changes, version = worker.changes_since(since)
+        if changes is not None:
+            return {"ok": True, "changes": changes, "version": version}
+    data, version = worker.snapshot_view()
+    return {"ok": True, "data": data, "version": version}
 
 
 def rpc_write(worker: OpcWorker, writes: Dict[str, Any], timeout: float = 20.0):
@@ -56,6 +98,38 @@ def rpc_call(worker: OpcWorker, method_nodeid: str, args: Optional[List[Any]] =
     return res2
 
 
+# -------------------------
+# Worker singleton (one OPC-UA thread/connection per process, shared by all sessions)
+# -------------------------
+@st.cache_resource(show_spinner=False)
+def get_worker() -> OpcWorker:
+    w = OpcWorker()
+    w.start()
+    return w
+
+
+# -------------------------
+# Cached DB reads (auto-refresh reruns the script every few seconds).
+# Experiments and tag lists change on a minutes-to-hours scale, so only the
+# time series is re-queried per tick; "Refresh metadata" clears the lists early.
+# -------------------------
+@st.cache_data(ttl=60, show_spinner=False)
+def db_list_experiments() -> List[Dict[str, Any]]:
+    return db_pg.list_experiments()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def db_list_tags(experiment_id: int) -> List[str]:
+    return db_pg.list_tags(experiment_id)
+
+
+@st.cache_data(ttl=2, show_spinner=False)
+def db_load_timeseries(experiment_id: int, tags: Tuple[str, ...], minutes: int, bucket_seconds: int = 0, limit: int = 0) -> pd.DataFrame:
+    # tags is a tuple so the cache key is hashable. ts_utc comes back already parsed to UTC
+    # datetimes (and NaT-free), so the cached frame is used as-is with no re-coercion per rerun.
+    return db_pg.load_timeseries(experiment_id, list(tags), minutes, bucket_seconds=bucket_seconds, limit=limit)
+
+
 # -------------------------
 # UI helpers
 # -------------------------
@@ -69,15 +143,68 @@ def _mappings_loaded() -> bool:
     )
 
 
-def _get_maps():
-    mappings = st.session_state.get("mappings", {}) if _mappings_loaded() else {}
-    sensor_vars = mappings.get("sensor_vars", {}) or {}
-    actuator_vars = mappings.get("actuator_vars", {}) or {}
-    methods = mappings.get("methods", {}) or {}
-    return sensor_vars, actuator_vars, methods
+def _index_actuators(actuator_vars: Dict[str, Any]) -> Dict[str, Dict[str, Dict[str, str]]]:
+    """
+    {reactor: {pwm_name: {channel: nodeid}}} in a single pass over actuator_vars.
+    Only changes when the address space is re-browsed, so it is built then, not per rerun.
+    """
+    index: Dict[str, Dict[str, Dict[str, str]]] = {}
+    for nid, info in (actuator_vars or {}).items():
+        if not isinstance(info, dict):
+            continue
+        name = info.get("name", "")
+        if not name or not name.startswith("pwm"):
+            continue
+        index.setdefault(info.get("reactor", ""), {}).setdefault(name, {})[info.get("channel", "")] = nid
+    return index
+
+
+def _index_methods(methods: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+    """{reactor: {method_name: nodeid}}; first nodeid wins, like the scan it replaces."""
+    index: Dict[str, Dict[str, str]] = {}
+    for nid, info in _method_iter(methods):
+        index.setdefault(info.get("reactor", ""), {}).setdefault(info.get("name", ""), nid)
+    return index
+
+
+def _index_sensors(sensor_vars: Dict[str, Any]) -> Dict[str, List[Tuple[str, str, Dict[str, Any]]]]:
+    """{reactor: [(nodeid, tag, info), ...] sorted by tag}; tag strings are formatted once per browse."""
+    index: Dict[str, List[Tuple[str, str, Dict[str, Any]]]] = {}
+    for nid, info in (sensor_vars or {}).items():
+        if isinstance(info, dict):
+            index.setdefault(info.get("reactor", ""), []).append((nid, _fmt_tag(info), info))
+    for rows in index.values():
+        rows.sort(key=lambda row: row[1])
+    return index
+
+
+def _set_mappings(mappings: Dict[str, Any]) -> None:
+    st.session_state["mappings"] = mappings
+    st.session_state["sensor_index"] = _index_sensors(mappings.get("sensor_vars", {}))
+    st.session_state["cal_sensor_options"] = {
+        reactor: sorted({f"{info.get('name', '')}:{info.get('channel', '')}" for _, _, info in rows if info.get("name") in CAL_SENSOR_GROUPS})
+        for reactor, rows in st.session_state["sensor_index"].items()
+    }
+    st.session_state["act_index"] = _index_actuators(mappings.get("actuator_vars", {}))
+    st.session_state["method_index"] = _index_methods(mappings.get("methods", {}))
+    st.session_state["cal_index"] = _index_calibration_methods(mappings.get("methods", {}))
+
+
+def _store_snapshot(res: Dict[str, Any]) -> None:
+    if "changes" in res:
+        # merge the delta into this session's own copy (the shared snapshot is read-only)
+        values = st.session_state.get("last_values")
+        if not isinstance(values, dict):
+            values = dict(values or {})
+        values.update(res["changes"])
+        st.session_state["last_values"] = values
+    else:
+        st.session_state["last_values"] = res.get("data", {})
+    st.session_state["last_version"] = res.get("version")
+    st.session_state["last_snapshot_ts"] = datetime.now(_UTC).isoformat()
 
 
-def _snapshot() -> Dict[str, Any]:
+def _snapshot() -> Mapping[str, Any]:
     return st.session_state.get("last_values", {}) or {}
 
 
@@ -96,57 +223,109 @@ def _method_iter(methods: Dict[str, Any]):
             yield nid, info
 
 
-def find_method_nodeid(methods: Dict[str, Any], reactor: str, name_exact: str) -> Optional[str]:
-    for nid, info in _method_iter(methods):
-        if info.get("reactor") == reactor and info.get("name") == name_exact:
-            return nid
-    return None
+def find_method_nodeid(reactor: str, name_exact: str) -> Optional[str]:
+    return st.session_state.get("method_index", {}).get(reactor, {}).get(name_exact)
 
 
-def find_calibration_method(methods: Dict[str, Any], reactor: str, sensor_name: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+def _index_calibration_methods(methods: Dict[str, Any]) -> Dict[Tuple[str, str], Tuple[str, Dict[str, Any]]]:
     """
-    Matches method entries like:
+    {(reactor, sensor_name): (nodeid, info)} for method entries like
       {"reactor":"R0","name":"ph:calibration"}  OR  {"name":"sid:calibration"} (sid includes sensor id)
-    We'll match on:
-      - correct reactor
-      - "calibration" in name
-      - sensor_name contained in name (best-effort)
+    matched on reactor, "calibration" in name and sensor_name contained in name (best-effort).
+    (reactor, "") holds the reactor's first calibration method as the fallback.
     """
-    s = (sensor_name or "").lower()
+    index: Dict[Tuple[str, str], Tuple[str, Dict[str, Any]]] = {}
     for nid, info in _method_iter(methods):
-        if info.get("reactor") != reactor:
-            continue
-        n = (info.get("name") or "").lower()
-        if "calibration" not in n:
+        name = (info.get("name") or "").lower()
+        if "calibration" not in name:
             continue
-        if s and s in n:
-            return nid, info
+        reactor = info.get("reactor", "")
+        index.setdefault((reactor, ""), (nid, info))
+        for sensor in CAL_SENSOR_GROUPS:
+            if sensor in name:
+                index.setdefault((reactor, sensor), (nid, info))
+    return index
+
+
+def find_calibration_method(reactor: str, sensor_name: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    index = st.session_state.get("cal_index", {})
     # fallback: first calibration method for reactor if any (better than crashing)
-    for nid, info in _method_iter(methods):
-        if info.get("reactor") == reactor and "calibration" in (info.get("name") or "").lower():
-            return nid, info
-    return None, None
+    return index.get((reactor, (sensor_name or "").lower())) or index.get((reactor, ""), (None, None))
 
 
-def altair_scatter(df: pd.DataFrame, title: str, y_label: str):
+@st.cache_data(max_entries=32, show_spinner=False)
+def classify_plot_tags(reactor: str, tags: Tuple[str, ...]) -> Dict[str, Any]:
     """
-    df columns: ts_utc (datetime), value (float)
+    Pick the default tag for each Stage 2 panel from an experiment's tag list.
+    Expected tag format: "R0:ph:pH", "R0:ph:oC", "R0:do:ppm", "R0:do:oC", "R0:biomass:415", ...
     """
-    if df.empty:
-        st.info("No samples in selected window.")
-        return
-    chart = (
+    # parse each tag once; (name, channel) -> tag for the experiment's reactor, first one wins
+    by_channel: Dict[Tuple[str, str], str] = {}
+    biomass_tags = []
+    for t in tags:
+        m = TAG_RE.fullmatch(t)
+        if m and m.group(1) == reactor:
+            by_channel.setdefault((m.group(2), m.group(3)), t)
+            if m.group(2) == "biomass":
+                biomass_tags.append(t)
+    biomass_tags.sort()
+    pick_tag = by_channel.get
+
+    default_bio = next((by_channel[("biomass", p)] for p in BIOMASS_PREFERENCE if ("biomass", p) in by_channel), None)
+    if not default_bio and biomass_tags:
+        default_bio = biomass_tags[0]
+
+    return {
+        "ph": pick_tag(("ph", "pH")),
+        "do": pick_tag(("do", "ppm")),
+        # Temperature: prefer do:oC then ph:oC if only one is available
+        "temp": pick_tag(("do", "oC")) or pick_tag(("ph", "oC")),
+        "biomass": biomass_tags,
+        "default_bio": default_bio,
+    }
+
+
+def _df_fingerprint(df: pd.DataFrame):
+    # row hashes of every column (vectorized), so a changed average in the open bucket of
+    # any panel builds a new chart; cheaper than st's default pickling of the frame
+    return (len(df), int(pd.util.hash_pandas_object(df, index=False).sum()))
+
+
+@st.cache_resource(max_entries=32, show_spinner=False, hash_funcs={pd.DataFrame: _df_fingerprint})
+def _panels_chart(df: pd.DataFrame, titles: Tuple[str, ...]) -> alt.FacetChart:
+    # all Stage 2 panels as one faceted scatter (one spec, one payload, one Vega view);
+    # facet charts need the data at the top level, so it is built from the frame itself
+    return (
         alt.Chart(df)
         .mark_circle(size=35)
         .encode(
             x=alt.X("ts_utc:T", title="Time (UTC)"),
-            y=alt.Y("value:Q", title=y_label),
-            tooltip=[alt.Tooltip("ts_utc:T", title="ts"), alt.Tooltip("value:Q", title="value")],
+            y=alt.Y("value:Q", title=None),
+            tooltip=[
+                alt.Tooltip("panel:N", title="plot"),
+                alt.Tooltip("ts_utc:T", title="ts"),
+                alt.Tooltip("value:Q", title="value"),
+            ],
         )
-        .properties(height=260, title=title)
+        .properties(width=420, height=260)
         .interactive()
+        .facet(
+            facet=alt.Facet("panel:N", sort=list(titles), title=None, header=alt.Header(labelFontSize=14)),
+            columns=2,
+        )
+        .resolve_scale(y="independent")
     )
-    st.altair_chart(chart, use_container_width=True)
+
+
+def altair_panels(df: pd.DataFrame, titles: Tuple[str, ...]):
+    """
+    df columns: ts_utc (datetime), value (float), panel (one of titles)
+    """
+    if df.empty:
+        st.info("No samples in selected window.")
+        return
+    # unchanged panels reuse the chart object built on a previous rerun
+    st.altair_chart(_panels_chart(df, titles), use_container_width=True)
 
 
 # -------------------------
@@ -160,16 +339,20 @@ st.caption(f"Server endpoint: {ENDPOINT}")
 st.sidebar.header("Auto-refresh")
 auto_on = st.sidebar.checkbox("Enable auto-refresh", value=False)
 auto_interval = st.sidebar.slider("Refresh interval (seconds)", 1, 10, 3)
-if auto_on:
+# With st.fragment the live pane and the Stage 2 plots rerun on their own timers (and on
+# their own widget interactions) instead of the whole script; older Streamlit falls back
+# to st_autorefresh rerunning everything.
+HAS_FRAGMENT = hasattr(st, "fragment")
+if auto_on and not HAS_FRAGMENT:
     st_autorefresh(interval=auto_interval * 1000, key="auto_refresh")
 
-# Start worker once
-if "opc_worker" not in st.session_state:
-    w = OpcWorker()
-    w.start()
-    st.session_state["opc_worker"] = w
 
-worker: OpcWorker = st.session_state["opc_worker"]
+def _fragment(func):
+    if not HAS_FRAGMENT:
+        return func
+    return st.fragment(run_every=auto_interval if auto_on else None)(func)
+
+worker: OpcWorker = get_worker()
 
 if "last_values" not in st.session_state:
     st.session_state["last_values"] = {}
@@ -181,9 +364,12 @@ top1, top2, top3, top4 = st.columns([1.2, 1.2, 1.4, 1.2])
 
 with top1:
     if st.button("Connect + Browse server"):
-        res = rpc_connect_browse(worker, timeout=30)
+        # browse + first snapshot in a single worker round-trip
+        res = rpc_bulk(worker, ["connect_browse", "read_snapshot"], timeout=30)
         if res.get("ok"):
-            st.session_state["mappings"] = res.get("mappings", {})
+            browse, snap_res = res["data"]["connect_browse"], res["data"]["read_snapshot"]
+            _set_mappings(browse.get("mappings", {}) or {})
+            _store_snapshot(snap_res)
             st.success("Browse OK (address space captured).")
         else:
             st.error(f"Browse failed: {res.get('error')}")
@@ -192,8 +378,7 @@ with top2:
     if st.button("Refresh values (snapshot)"):
         res = rpc_read_snapshot(worker, timeout=10)
         if res.get("ok"):
-            st.session_state["last_values"] = res.get("data", {})
-            st.session_state["last_snapshot_ts"] = datetime.now(timezone.utc).isoformat()
+            _store_snapshot(res)
             st.success("Snapshot OK")
         else:
             st.error(f"Snapshot failed: {res.get('error')}")
@@ -204,23 +389,12 @@ with top3:
     st.write(f"Last snapshot: {ts}")
 
 with top4:
-    if st.button("Stop worker / Disconnect"):
+    # the worker is shared by every open tab, so stopping it is gated behind a confirmation
+    confirm_stop = st.checkbox("Disconnect all sessions", help="The OPC-UA worker is shared: stopping it disconnects every open tab")
+    if st.button("Stop worker / Disconnect", disabled=not confirm_stop):
         worker.stop()
-        st.session_state.pop("opc_worker", None)
-        st.warning("Worker stopped. Reload page to restart.")
-
-# If auto-refresh is ON, refresh snapshot (only if we already connected/browsed once)
-if auto_on and _mappings_loaded():
-    res = rpc_read_snapshot(worker, timeout=10)
-    if res.get("ok"):
-        st.session_state["last_values"] = res.get("data", {})
-        st.session_state["last_snapshot_ts"] = datetime.now(timezone.utc).isoformat()
-
-sensor_vars, actuator_vars, methods = _get_maps()
-snap = _snapshot()
-
-# Reactor tabs (requirement)
-tabs = st.tabs(["R0", "R1", "R2"])
+        get_worker.clear()
+        st.warning("Worker stopped for all sessions. Reload page to restart.")
 
 
 def render_reactor_tab(reactor: str):
@@ -230,29 +404,34 @@ def render_reactor_tab(reactor: str):
         st.info("No address space loaded yet. Click **Connect + Browse server** first.")
         return
 
+    # sensors/actuators/methods are read through the per-browse indexes built in _set_mappings
+    snap = _snapshot()
+
     # -------------------------
     # Address space table (sensors + selected actuators)
     # -------------------------
     st.subheader("Live sensor values (from browsed address space)")
 
-    rows = []
-    for nid, info in (sensor_vars or {}).items():
-        if not isinstance(info, dict):
-            continue
-        if info.get("reactor") != reactor:
-            continue
-        rows.append(
-            {
-                "nodeid": nid,
-                "tag": _fmt_tag(info),
-                "value": snap.get(nid, info.get("value", None)),
-            }
-        )
+    # build the table column-wise from the per-browse index (tags formatted and sorted already)
+    infos = st.session_state.get("sensor_index", {}).get(reactor, [])
 
-    if not rows:
+    if not infos:
         st.info("No sensor variables found for this reactor (check server address space / browse logic).")
     else:
-        df = pd.DataFrame(rows).sort_values(by=["tag"])
+        # the snapshot version identifies its contents, so an idle plant reuses the last frame
+        key = (st.session_state.get("last_version"), id(infos))
+        cached = st.session_state.setdefault("sensor_df", {}).get(reactor)
+        if cached is not None and cached[0] == key:
+            df = cached[1]
+        else:
+            df = pd.DataFrame(
+                {
+                    "nodeid": [nid for nid, _, _ in infos],
+                    "tag": [tag for _, tag, _ in infos],
+                    "value": [snap.get(nid, info.get("value")) for nid, _, info in infos],
+                }
+            )
+            st.session_state["sensor_df"][reactor] = (key, df)
         st.dataframe(df, use_container_width=True, hide_index=True)
 
     st.divider()
@@ -261,19 +440,8 @@ def render_reactor_tab(reactor: str):
     # Actuators: tabs per actuator (requirement)
     # -------------------------
     st.subheader("Actuator controls")
-    # group by actuator name (pwm0..pwm3)
-    act_by_name: Dict[str, Dict[str, str]] = {}
-    for nid, info in (actuator_vars or {}).items():
-        if not isinstance(info, dict):
-            continue
-        if info.get("reactor") != reactor:
-            continue
-        name = info.get("name", "")
-        ch = info.get("channel", "")
-        if not name or not name.startswith("pwm"):
-            continue
-        act_by_name.setdefault(name, {})
-        act_by_name[name][ch] = nid
+    # grouped by actuator name (pwm0..pwm3), indexed once per browse
+    act_by_name = st.session_state.get("act_index", {}).get(reactor, {})
 
     if not act_by_name:
         st.warning("No pwm mappings found for this reactor.")
@@ -286,8 +454,12 @@ def render_reactor_tab(reactor: str):
                 nodes = act_by_name[act_name]
 
                 # Show current values (read-only)
-                cur = {k: snap.get(nid, None) for k, nid in nodes.items()}
-                st.caption(f"Current (subscription snapshot): {cur}")
+                st.caption("Current (subscription snapshot): " + " | ".join(f"{k}={snap.get(nid)}" for k, nid in nodes.items()))
+                # form defaults, coerced once: (time_on, time_off, lb, ub, setpoint)
+                d_on, d_off, d_lb, d_ub, d_sp = (
+                    float(snap.get(nodes.get(k)) or default)
+                    for k, default in (("time_on", 0.0), ("time_off", 0.0), ("lb", 0.0), ("ub", 100.0), ("setpoint", 0.0))
+                )
 
                 with st.form(f"{reactor}_{act_name}_form"):
                     colA, colB = st.columns(2)
@@ -300,48 +472,43 @@ def render_reactor_tab(reactor: str):
                         )
                         time_on = st.number_input(
                             f"{reactor} {act_name} time_on (s)",
-                            value=float(cur.get("time_on") or 0.0),
+                            value=d_on,
                             key=f"{reactor}_{act_name}_time_on",
                         )
                         time_off = st.number_input(
                             f"{reactor} {act_name} time_off (s)",
-                            value=float(cur.get("time_off") or 0.0),
+                            value=d_off,
                             key=f"{reactor}_{act_name}_time_off",
                         )
                     with colB:
                         lb = st.number_input(
                             f"{reactor} {act_name} lb",
-                            value=float(cur.get("lb") or 0.0),
+                            value=d_lb,
                             key=f"{reactor}_{act_name}_lb",
                         )
                         ub = st.number_input(
                             f"{reactor} {act_name} ub",
-                            value=float(cur.get("ub") or 100.0),
+                            value=d_ub,
                             key=f"{reactor}_{act_name}_ub",
                         )
                         setpoint = st.number_input(
                             f"{reactor} {act_name} setpoint",
-                            value=float(cur.get("setpoint") or 0.0),
+                            value=d_sp,
                             key=f"{reactor}_{act_name}_setpoint",
                         )
 
                     submit = st.form_submit_button(f"Write {act_name} for {reactor}")
 
                 if submit:
-                    writes: Dict[str, Any] = {}
-
-                    if "method" in nodes:
-                        writes[nodes["method"]] = METHOD_TO_INT.get(method_label, 0)
-
-                    for field, val in [
-                        ("time_on", float(time_on)),
-                        ("time_off", float(time_off)),
-                        ("lb", float(lb)),
-                        ("ub", float(ub)),
-                        ("setpoint", float(setpoint)),
-                    ]:
-                        if field in nodes:
-                            writes[nodes[field]] = val
+                    fields = {
+                        "method": METHOD_TO_INT.get(method_label, 0),
+                        "time_on": float(time_on),
+                        "time_off": float(time_off),
+                        "lb": float(lb),
+                        "ub": float(ub),
+                        "setpoint": float(setpoint),
+                    }
+                    writes: Dict[str, Any] = {nodes[k]: v for k, v in fields.items() if k in nodes}
 
                     if not writes:
                         st.warning("Nothing to write (no matching NodeIds for these fields).")
@@ -362,7 +529,7 @@ def render_reactor_tab(reactor: str):
 
     with m1:
         if st.button("Call set_pairing", key=f"{reactor}_set_pairing"):
-            nid = find_method_nodeid(methods, reactor, "set_pairing")
+            nid = find_method_nodeid(reactor, "set_pairing")
             if not nid:
                 st.error("set_pairing method not found for reactor.")
             else:
@@ -374,7 +541,7 @@ def render_reactor_tab(reactor: str):
 
     with m2:
         if st.button("Call unpair", key=f"{reactor}_unpair"):
-            nid = find_method_nodeid(methods, reactor, "unpair")
+            nid = find_method_nodeid(reactor, "unpair")
             if not nid:
                 st.error("unpair method not found for reactor.")
             else:
@@ -393,20 +560,8 @@ def render_reactor_tab(reactor: str):
     st.subheader("Calibration")
     st.caption("Run sensor calibrations (CP1 / CP2). Results are stored in the database and shown here.")
 
-    # Available sensors derived from browsed sensor_vars
-    # Keep it practical: only (ph, do) channels + biomass channels selectable
-    sensor_options = []
-    for nid, info in (sensor_vars or {}).items():
-        if not isinstance(info, dict):
-            continue
-        if info.get("reactor") != reactor:
-            continue
-        name = info.get("name", "")
-        ch = info.get("channel", "")
-        if name in {"ph", "do", "biomass"}:
-            sensor_options.append(f"{name}:{ch}")
-
-    sensor_options = sorted(set(sensor_options))
+    # Available sensors derived from browsed sensor_vars (indexed once per browse)
+    sensor_options = st.session_state.get("cal_sensor_options", {}).get(reactor, [])
     if not sensor_options:
         st.info("No sensors found for calibration on this reactor.")
         return
@@ -415,7 +570,7 @@ def render_reactor_tab(reactor: str):
     sensor_name, sensor_channel = sel.split(":", 1)
 
     # Find calibration method nodeid (from browsed methods dictionary)
-    cal_nid, cal_info = find_calibration_method(methods, reactor, sensor_name)
+    cal_nid, cal_info = find_calibration_method(reactor, sensor_name)
 
     tab_cp1, tab_cp2, tab_hist = st.tabs(["CP1", "CP2", "History"])
 
@@ -456,7 +611,7 @@ def render_reactor_tab(reactor: str):
             except Exception:
                 pass
 
-            ts_iso = datetime.now(timezone.utc).isoformat()
+            ts_iso = datetime.now(_UTC).isoformat()
 
             # store
             db_pg.insert_calibration(
@@ -505,108 +660,109 @@ def render_reactor_tab(reactor: str):
             st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
 
 
-for i, tab in enumerate(tabs):
-    with tab:
-        render_reactor_tab(["R0", "R1", "R2"][i])
+@_fragment
+def live_pane():
+    # If auto-refresh is ON, refresh snapshot (only if we already connected/browsed once,
+    # the worker has seen new values since the last one, and at most once per interval even
+    # when widget interactions rerun the pane faster than that)
+    now = time.monotonic()
+    if (
+        auto_on
+        and _mappings_loaded()
+        and now - st.session_state.get("last_auto_snapshot", 0.0) >= auto_interval - AUTO_SLACK_S
+        and worker.version != st.session_state.get("last_version")
+    ):
+        res = rpc_read_snapshot(worker, timeout=10, since=st.session_state.get("last_version"))
+        if res.get("ok"):
+            _store_snapshot(res)
+        st.session_state["last_auto_snapshot"] = now
+
+    # Reactor tabs (requirement)
+    tabs = st.tabs(["R0", "R1", "R2"])
+    for i, tab in enumerate(tabs):
+        with tab:
+            render_reactor_tab(["R0", "R1", "R2"][i])
+
+
+live_pane()
 
 # -------------------------
 # Stage 2 plots (requirements: 1h..24h, scatter, 4 plots)
 # -------------------------
-st.divider()
-st.subheader("Stage 2 — Logging & Plots (from DB)")
-
-experiments = db_pg.list_experiments()
-if not experiments:
-    st.warning("No experiments found. Run the sampler to create experiments/samples.")
-    st.stop()
-
-exp_labels = [f"#{e['id']} | {e['reactor']} | {e['name']} | {e['started_at_utc']}" for e in experiments]
-sel_label = st.selectbox("Experiment", exp_labels, key="plot_exp")
-sel_id = int(sel_label.split("|")[0].strip().lstrip("#"))
-exp_reactor = sel_label.split("|")[1].strip()
-
-tags = db_pg.list_tags(sel_id)
-if not tags:
-    st.warning("No tags found for this experiment.")
-    st.stop()
-
-hours = st.slider("Time window (hours)", min_value=1, max_value=24, value=6, step=1)
-minutes = int(hours * 60)
-
-# Identify default tags for 4 plots
-# Expected tag format: "R0:ph:pH", "R0:ph:oC", "R0:do:ppm", "R0:do:oC", "R0:biomass:415", ...
-def pick_tag(endswith: str) -> Optional[str]:
-    for t in tags:
-        if t.endswith(endswith) and t.startswith(exp_reactor + ":"):
-            return t
-    return None
-
-ph_tag = pick_tag(":ph:pH")
-do_tag = pick_tag(":do:ppm")
-
-# Temperature: prefer do:oC then ph:oC if only one is available
-temp_tag = pick_tag(":do:oC") or pick_tag(":ph:oC")
-
-biomass_tags = sorted([t for t in tags if ":biomass:" in t and t.startswith(exp_reactor + ":")])
-default_bio = None
-for pref in [":biomass:415", ":biomass:445", ":biomass:480", ":biomass:515", ":biomass:555", ":biomass:590", ":biomass:630", ":biomass:680", ":biomass:nir", ":biomass:clear"]:
-    for t in biomass_tags:
-        if t.endswith(pref):
-            default_bio = t
-            break
-    if default_bio:
-        break
-if not default_bio and biomass_tags:
-    default_bio = biomass_tags[0]
-
-bio_tag = st.selectbox("Biomass channel", options=biomass_tags or ["(none)"], index=(biomass_tags.index(default_bio) if default_bio in biomass_tags else 0))
-
-plot_tags = [t for t in [ph_tag, do_tag, temp_tag, bio_tag] if t and t != "(none)"]
-
-df_all = db_pg.load_timeseries(sel_id, plot_tags, minutes)
-
-if df_all.empty:
-    st.info("No samples in selected window.")
-else:
-    # Ensure datetime
-    if "ts_utc" in df_all.columns:
-        df_all["ts_utc"] = pd.to_datetime(df_all["ts_utc"], utc=True, errors="coerce")
-        df_all = df_all.dropna(subset=["ts_utc"])
-
-    # Split into 4 panels (scatter)
-    c1, c2 = st.columns(2)
-    c3, c4 = st.columns(2)
-
-    def series_df(tag: str) -> pd.DataFrame:
-        d = df_all[df_all["tag"] == tag][["ts_utc", "value"]].copy()
-        d = d.sort_values("ts_utc")
-        return d
-
-    with c1:
-        if ph_tag:
-            altair_scatter(series_df(ph_tag), f"{exp_reactor} pH (pH)", "pH")
-        else:
-            st.info("pH tag not found in DB for this experiment.")
+@_fragment
+def stage2_plots():
+    st.divider()
+    st.subheader("Stage 2 — Logging & Plots (from DB)")
 
-    with c2:
-        if do_tag:
-            altair_scatter(series_df(do_tag), f"{exp_reactor} DO (ppm)", "DO (ppm)")
-        else:
-            st.info("DO tag not found in DB for this experiment.")
+    if st.button("Refresh metadata", help="Reload the experiment and tag lists from the DB"):
+        db_list_experiments.clear()
+        db_list_tags.clear()
 
-    with c3:
-        if temp_tag:
-            altair_scatter(series_df(temp_tag), f"{exp_reactor} Temperature (°C)", "Temperature (°C)")
-        else:
-            st.info("Temperature tag (oC) not found in DB for this experiment.")
+    experiments = db_list_experiments()
+    if not experiments:
+        st.warning("No experiments found. Run the sampler to create experiments/samples.")
+        return
 
-    with c4:
-        if bio_tag and bio_tag != "(none)":
-            altair_scatter(series_df(bio_tag), f"{exp_reactor} Biomass", "Biomass")
-        else:
-            st.info("Biomass tag not found in DB for this experiment.")
+    exp_labels = [f"#{e['id']} | {e['reactor']} | {e['name']} | {e['started_at_utc']}" for e in experiments]
+    sel_label = st.selectbox("Experiment", exp_labels, key="plot_exp")
+    sel_id = int(sel_label.split("|")[0].strip().lstrip("#"))
+    exp_reactor = sel_label.split("|")[1].strip()
+
+    tags = db_list_tags(sel_id)
+    if not tags:
+        st.warning("No tags found for this experiment.")
+        return
+
+    hours = st.slider("Time window (hours)", min_value=1, max_value=24, value=6, step=1)
+    minutes = int(hours * 60)
+    bucket_seconds = max(1, int(hours * 3600 / PLOT_BUCKETS))
 
-    with st.expander("Raw samples (latest 200)", expanded=False):
-        st.dataframe(df_all.tail(200), use_container_width=True, hide_index=True)
+    # Default tags for the 4 plots; only changes when the experiment's tag list does
+    tag_defaults = classify_plot_tags(exp_reactor, tuple(tags))
+    ph_tag = tag_defaults["ph"]
+    do_tag = tag_defaults["do"]
+    temp_tag = tag_defaults["temp"]
+    biomass_tags = tag_defaults["biomass"]
+    default_bio = tag_defaults["default_bio"]
+
+    bio_tag = st.selectbox("Biomass channel", options=biomass_tags or ["(none)"], index=(biomass_tags.index(default_bio) if default_bio in biomass_tags else 0))
+
+    plot_tags = [t for t in [ph_tag, do_tag, temp_tag, bio_tag] if t and t != "(none)"]
+
+    df_all = db_load_timeseries(sel_id, tuple(plot_tags), minutes, bucket_seconds, MAX_PLOT_POINTS)
+
+    if df_all.empty:
+        st.info("No samples in selected window.")
+    else:
+        # one pass over df_all instead of a boolean mask per panel; rows arrive sorted by ts_utc.
+        # tag is categorical (from db_pg), so this groups on integer codes.
+        groups = {tag: g[["ts_utc", "value"]] for tag, g in df_all.groupby("tag", sort=False, observed=True)}
+        empty = df_all.iloc[0:0][["ts_utc", "value"]]
+
+        def series_df(tag: str) -> pd.DataFrame:
+            # already at most PLOT_BUCKETS bucket averages per tag, so no thinning is needed here
+            return groups.get(tag, empty)
+
+        # 4 scatter panels (pH, DO, temperature, biomass), fused into one faceted chart
+        if bio_tag == "(none)":
+            bio_tag = None
+        panels = [
+            (ph_tag, f"{exp_reactor} pH (pH)", "pH tag not found in DB for this experiment."),
+            (do_tag, f"{exp_reactor} DO (ppm)", "DO tag not found in DB for this experiment."),
+            (temp_tag, f"{exp_reactor} Temperature (°C)", "Temperature tag (oC) not found in DB for this experiment."),
+            (bio_tag, f"{exp_reactor} Biomass", "Biomass tag not found in DB for this experiment."),
+        ]
+        for tag, _, missing in panels:
+            if not tag:
+                st.info(missing)
+        present = [(tag, title) for tag, title, _ in panels if tag]
+        plot_df = pd.concat([series_df(tag).assign(panel=title) for tag, title in present], ignore_index=True)
+        altair_panels(plot_df, tuple(title for _, title in present))
+
+        with st.expander(f"Plotted samples (latest 200, {bucket_seconds}s averages)", expanded=False):
+            st.dataframe(df_all.tail(200), use_container_width=True, hide_index=True)
+
+
+stage2_plots()
 
 st.info("Calibration will only run if the OPC-UA server exposes calibration methods for sensors. If you need a full demo, add calibration methods to mock_server.py.")
\ No newline at end of file
@@ -1,17 +1,31 @@
 # client.py
+import asyncio
 import logging
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, Optional, List
+from typing import Any, Callable, Dict, Optional, List, Tuple
 
-from asyncua import Client, ua
+from asyncua import Client, Node, ua
 
+# handlers/levels are left to the entry point (sampler.py, the Streamlit app)
 log = logging.getLogger("ReactorOpcClient")
-logging.basicConfig(level=logging.INFO)
 
 METHOD_ENUM = {0: "manual", 1: "timer", 2: "on_boundaries", 3: "pid"}
 METHOD_ENUM_INV = {v: k for k, v in METHOD_ENUM.items()}
 
 
+def _coerce_method(value: Any) -> Any:
+    # "timer" -> 1 etc.; ints and unknown labels pass through
+    return METHOD_ENUM_INV.get(value, value) if isinstance(value, str) else value
+
+
+# publishing intervals: actuator state is what operators just wrote and want to see echoed,
+# sensors drift slowly and are sampled to the DB separately
+ACTUATOR_PUBLISH_MS = 250
+SENSOR_PUBLISH_MS = 1000
+# monitored items per subscribe call when the server doesn't advertise MaxMonitoredItemsPerCall
+DEFAULT_ITEMS_PER_CALL = 500
+
+
 @dataclass
 class VarInfo:
     reactor: str
@@ -28,10 +42,15 @@ VariableInfo = VarInfo
 class _SubHandler:
     def __init__(self, on_change: Callable[[str, Any], None]):
         self.on_change = on_change
+        # NodeId -> string form, seeded at subscribe time; lazily filled for anything else
+        self._nid_str: Dict[Any, str] = {}
 
     def datachange_notification(self, node, val, data):
         try:
-            self.on_change(node.nodeid.to_string(), val)
+            nid = self._nid_str.get(node.nodeid)
+            if nid is None:
+                nid = self._nid_str[node.nodeid] = node.nodeid.to_string()
+            self.on_change(nid, val)
         except Exception:
             pass
 
@@ -53,8 +72,12 @@ class ReactorOpcClient:
         self.sensor_vars: Dict[str, Dict[str, Any]] = {}
         self.actuator_vars: Dict[str, Dict[str, Any]] = {}
         self.methods: Dict[str, Dict[str, Any]] = {}
+        # nodeid string -> Node found while browsing, so reads/writes skip NodeId parsing
+        self._nodes: Dict[str, Node] = {}
+        # nodeid -> value coercer for nodes that take labels (the PWM "method" enum), set at browse
+        self._coercers: Dict[str, Callable[[Any], Any]] = {}
 
-        self._subscription = None
+        self._subscriptions = []
         self._sub_handler = None
         self._sub_handles = []
         self._on_change_cb: Optional[Callable[[str, Any], None]] = None
@@ -68,40 +91,80 @@ class ReactorOpcClient:
 
     async def disconnect(self):
         try:
-            if self._subscription:
+            for sub in self._subscriptions:
                 try:
-                    await self._subscription.delete()
+                    await sub.delete()
                 except Exception:
                     pass
-                self._subscription = None
+            self._subscriptions = []
         finally:
             await self.client.disconnect()
             log.info("Disconnected")
 
+    def _node(self, nodeid: str) -> Node:
+        # browsed Node if we have one; otherwise parse the string once and keep the result
+        node = self._nodes.get(nodeid)
+        if node is None:
+            node = self._nodes[nodeid] = self.client.get_node(nodeid)
+        return node
+
+    async def _read(self, targets: List[Tuple[ua.NodeId, int]]) -> List[Any]:
+        """
+        Read every (nodeid, attribute) in `targets` with a single OPC-UA Read request.
+        Entries whose read fails come back as None; if the request itself fails, all do.
+        """
+        if not targets:
+            return []
+        params = ua.ReadParameters()
+        for node_id, attribute in targets:
+            rv = ua.ReadValueId()
+            rv.NodeId = node_id
+            rv.AttributeId = attribute
+            params.NodesToRead.append(rv)
+        try:
+            results = await self.client.uaclient.read(params)
+        except Exception:
+            log.exception("Batched read of %d attributes failed", len(targets))
+            return [None] * len(targets)
+        return [r.Value.Value if r.StatusCode.is_good() and r.Value is not None else None for r in results]
+
+    async def _browse_names(self, nodes) -> List[Optional[str]]:
+        # BrowseName of every node in one round-trip (None where unreadable)
+        qns = await self._read([(n.nodeid, ua.AttributeIds.BrowseName) for n in nodes])
+        return [qn.Name if qn else None for qn in qns]
+
     async def browse_address_space(self):
         """
         Discover reactors and populate sensor_vars, actuator_vars, methods.
+        The walk only records nodes; BrowseNames are read one batch per children list and
+        the initial values of all variables in a single Read at the end.
         """
         self.sensor_vars.clear()
         self.actuator_vars.clear()
         self.methods.clear()
+        self._nodes.clear()
+        self._coercers.clear()
 
         objects = self.client.nodes.objects
         kids = await objects.get_children()
 
         reactors = {}
-        for n in kids:
-            try:
-                bn = await n.read_browse_name()
-            except Exception:
-                bn = None
-            if bn and bn.Name in {"R0", "R1", "R2"}:
-                reactors[bn.Name] = n
-
-        for rname, rnode in reactors.items():
-            await self._browse_reactor(rname, rnode)
+        for n, name in zip(kids, await self._browse_names(kids)):
+            if name in {"R0", "R1", "R2"}:
+                reactors[name] = n
+
+        # reactors (and the method walk under each) are independent; asyncua multiplexes the
+        # requests over one session, so they run concurrently instead of back to back
+        await asyncio.gather(
+            *(self._browse_reactor(rname, rnode) for rname, rnode in reactors.items()),
             # Also collect methods anywhere under reactor
-            await self._collect_methods_recursive(rname, rnode, max_depth=6)
+            *(self._collect_methods_recursive(rname, rnode, max_depth=6) for rname, rnode in reactors.items()),
+        )
+
+        variables = {**self.sensor_vars, **self.actuator_vars}
+        values = await self.read_many(list(variables))
+        for info, val in zip(variables.values(), values):
+            info["value"] = val
 
         log.info(
             "Browse complete. sensors=%d actuators=%d methods=%d",
@@ -115,117 +178,66 @@ class ReactorOpcClient:
 
     async def _browse_reactor(self, reactor: str, reactor_node):
         children = await reactor_node.get_children()
+        names = await self._browse_names(children)
         by_name = {}
-        for ch in children:
-            try:
-                bn = await ch.read_browse_name()
-            except Exception:
-                bn = None
-            if bn:
-                by_name[bn.Name] = ch
+        for ch, name in zip(children, names):
+            if name:
+                by_name[name] = ch
 
+        groups = []
         for key, node in by_name.items():
             if key.endswith(":ph"):
-                await self._browse_sensor_group(reactor, "ph", node)
+                groups.append(self._browse_sensor_group(reactor, "ph", node))
             elif key.endswith(":do"):
-                await self._browse_sensor_group(reactor, "do", node)
+                groups.append(self._browse_sensor_group(reactor, "do", node))
             elif key.endswith(":biomass"):
-                await self._browse_biomass(reactor, node)
+                groups.append(self._browse_biomass(reactor, node))
             elif ":pwm" in key:
-                group = key.split(":")[-1]
-                await self._browse_pwm(reactor, group, node)
+                group = key.rpartition(":")[2]
+                groups.append(self._browse_pwm(reactor, group, node))
             elif key in {"set_pairing", "unpair"}:
                 nid = node.nodeid.to_string()
+                self._nodes[nid] = node
                 self.methods[nid] = {"reactor": reactor, "name": key, "channel": "", "value": None}
-
-        for ch in children:
-            try:
-                bn = await ch.read_browse_name()
-            except Exception:
-                bn = None
-            if bn and bn.Name in {"set_pairing", "unpair"}:
-                nid = ch.nodeid.to_string()
-                self.methods[nid] = {"reactor": reactor, "name": bn.Name, "channel": "", "value": None}
+        await asyncio.gather(*groups)
 
     async def _browse_sensor_group(self, reactor: str, group: str, group_node):
         vars_ = await group_node.get_children()
-        for v in vars_:
-            try:
-                bn = await v.read_browse_name()
-            except Exception:
-                bn = None
-            if not bn:
+        for v, name in zip(vars_, await self._browse_names(vars_)):
+            if not name:
                 continue
-            channel = bn.Name.split(":")[-1]
+            channel = name.rpartition(":")[2]
             nid = v.nodeid.to_string()
-            try:
-                val = await v.read_value()
-            except Exception:
-                val = None
-            self.sensor_vars[nid] = {"reactor": reactor, "name": group, "channel": channel, "value": val}
+            self._nodes[nid] = v
+            # value is filled in by the batched read at the end of browse_address_space
+            self.sensor_vars[nid] = {"reactor": reactor, "name": group, "channel": channel, "value": None}
 
     async def _browse_biomass(self, reactor: str, group_node):
-        vars_ = await group_node.get_children()
-        for v in vars_:
-            try:
-                bn = await v.read_browse_name()
-            except Exception:
-                bn = None
-            if not bn:
-                continue
-            channel = bn.Name.split(":")[-1]
-            nid = v.nodeid.to_string()
-            try:
-                val = await v.read_value()
-            except Exception:
-                val = None
-            self.sensor_vars[nid] = {"reactor": reactor, "name": "biomass", "channel": channel, "value": val}
+        await self._browse_sensor_group(reactor, "biomass", group_node)
 
     async def _browse_pwm(self, reactor: str, group: str, pwm_node):
         kids = await pwm_node.get_children()
-        ctrl = None
-        for ch in kids:
-            try:
-                bn = await ch.read_browse_name()
-            except Exception:
-                bn = None
-            if bn and bn.Name == "ControlMethod":
-                ctrl = ch
-                break
+        names = await self._browse_names(kids)
+        ctrl = next((ch for ch, name in zip(kids, names) if name == "ControlMethod"), None)
 
-        for ch in kids:
-            try:
-                bn = await ch.read_browse_name()
-            except Exception:
-                bn = None
-            if bn and bn.Name == "curr_value":
+        for ch, name in zip(kids, names):
+            if name == "curr_value":
                 nid = ch.nodeid.to_string()
-                try:
-                    val = await ch.read_value()
-                except Exception:
-                    val = None
-                self.actuator_vars[nid] = {"reactor": reactor, "name": group, "channel": "curr_value", "value": val}
+                self._nodes[nid] = ch
+                self.actuator_vars[nid] = {"reactor": reactor, "name": group, "channel": "curr_value", "value": None}
 
         if not ctrl:
             return
 
         ctrl_kids = await ctrl.get_children()
-        for v in ctrl_kids:
-            try:
-                bn = await v.read_browse_name()
-            except Exception:
-                bn = None
-            if not bn:
-                continue
-            channel = bn.Name
-            if channel == "EnumStrings":
+        for v, channel in zip(ctrl_kids, await self._browse_names(ctrl_kids)):
+            if not channel or channel == "EnumStrings":
                 continue
             nid = v.nodeid.to_string()
-            try:
-                val = await v.read_value()
-            except Exception:
-                val = None
-            self.actuator_vars[nid] = {"reactor": reactor, "name": group, "channel": channel, "value": val}
+            self._nodes[nid] = v
+            if channel == "method":
+                self._coercers[nid] = _coerce_method
+            self.actuator_vars[nid] = {"reactor": reactor, "name": group, "channel": channel, "value": None}
 
     async def _collect_methods_recursive(self, reactor: str, root_node, max_depth: int = 4):
         async def walk(node, depth: int):
@@ -235,34 +247,63 @@ class ReactorOpcClient:
                 kids = await node.get_children()
             except Exception:
                 return
-            for ch in kids:
-                try:
-                    bn = await ch.read_browse_name()
-                    nc = await ch.read_node_class()
-                except Exception:
+            # BrowseName and NodeClass of all children in one request
+            attrs = await self._read(
+                [(ch.nodeid, a) for ch in kids for a in (ua.AttributeIds.BrowseName, ua.AttributeIds.NodeClass)]
+            )
+            subtrees = []
+            for ch, bn, nc in zip(kids, attrs[0::2], attrs[1::2]):
+                if nc is None:
                     continue
                 if nc == ua.NodeClass.Method:
                     nid = ch.nodeid.to_string()
+                    self._nodes[nid] = ch
                     self.methods[nid] = {"reactor": reactor, "name": (bn.Name if bn else ""), "channel": "", "value": None}
                 else:
                     if nc == ua.NodeClass.Object:
-                        await walk(ch, depth + 1)
+                        subtrees.append(walk(ch, depth + 1))
+            await asyncio.gather(*subtrees)
         await walk(root_node, 0)
 
     async def init_subscriptions(self, on_change: Optional[Callable[[str, Any], None]] = None, on_change_cb: Optional[Callable[[str, Any], None]] = None, **_ignored):
+        """
+        Subscribe to data changes of every browsed variable: one subscription for actuators
+        and one for sensors, each with its own publishing interval. After this the
+        "value" fields track the server and read_snapshot needs no round-trips.
+        """
         self._on_change_cb = on_change_cb or on_change
         self._sub_handler = _SubHandler(self._handle_change)
-        self._subscription = await self.client.create_subscription(500, self._sub_handler)
-        nodeids = list(self.sensor_vars.keys()) + list(self.actuator_vars.keys())
-        nodes = [self.client.get_node(nid) for nid in nodeids]
-        if nodes:
-            handles = await self._subscription.subscribe_data_change(nodes)
-            if isinstance(handles, list):
-                self._sub_handles.extend(handles)
-            else:
-                self._sub_handles.append(handles)
+        limit = await self._max_monitored_items_per_call()
+        for interval_ms, variables in ((ACTUATOR_PUBLISH_MS, self.actuator_vars), (SENSOR_PUBLISH_MS, self.sensor_vars)):
+            if not variables:
+                continue
+            sub = await self.client.create_subscription(interval_ms, self._sub_handler)
+            self._subscriptions.append(sub)
+            nodes = [self._node(nid) for nid in variables]
+            # pre-seed the handler's id -> string map so notifications never format a NodeId
+            self._sub_handler._nid_str.update((n.nodeid, nid) for n, nid in zip(nodes, variables))
+            # stay under the server's per-call limit; the chunks are registered concurrently
+            results = await asyncio.gather(
+                *(sub.subscribe_data_change(nodes[i:i + limit]) for i in range(0, len(nodes), limit))
+            )
+            for handles in results:
+                if isinstance(handles, list):
+                    self._sub_handles.extend(handles)
+                else:
+                    self._sub_handles.append(handles)
         return True
 
+    async def _max_monitored_items_per_call(self) -> int:
+        # OperationalLimits.MaxMonitoredItemsPerCall; 0 or unreadable -> DEFAULT_ITEMS_PER_CALL
+        try:
+            node = await self.client.nodes.server.get_child(
+                ["0:ServerCapabilities", "0:OperationalLimits", "0:MaxMonitoredItemsPerCall"]
+            )
+            limit = int(await node.read_value() or 0)
+        except Exception:
+            limit = 0
+        return limit if limit > 0 else DEFAULT_ITEMS_PER_CALL
+
     def _handle_change(self, nodeid: str, value: Any):
         if nodeid in self.sensor_vars:
             self.sensor_vars[nodeid]["value"] = value
@@ -274,33 +315,62 @@ class ReactorOpcClient:
             except Exception:
                 pass
 
-    async def read_snapshot(self):
-        snap: Dict[str, Any] = {}
-        for nid, info in self.sensor_vars.items():
-            snap[nid] = info.get("value")
-        for nid, info in self.actuator_vars.items():
-            snap[nid] = info.get("value")
+    def read_snapshot(self) -> Dict[str, Any]:
+        # subscription-maintained values; an in-memory copy, no server reads
+        snap = {nid: info.get("value") for nid, info in self.sensor_vars.items()}
+        snap.update((nid, info.get("value")) for nid, info in self.actuator_vars.items())
         return snap
 
-    async def write(self, nodeid: str, value: Any):
-        node = self.client.get_node(nodeid)
-        if isinstance(value, str) and value in METHOD_ENUM_INV:
-            value = METHOD_ENUM_INV[value]
-        await node.write_value(value)
+    async def read_many(self, nodeids: List[str]) -> List[Any]:
+        """
+        Current values of `nodeids` in a single OPC-UA Read request (one round-trip instead
+        of one per node). Nodes whose read fails come back as None.
+        """
+        return await self._read([(self._node(nid).nodeid, ua.AttributeIds.Value) for nid in nodeids])
+
+    def _coerce(self, nodeid: str, value: Any) -> Any:
+        coerce = self._coercers.get(nodeid)
+        return coerce(value) if coerce else value
+
+    def _remember(self, nodeid: str, value: Any) -> None:
         if nodeid in self.actuator_vars:
             self.actuator_vars[nodeid]["value"] = value
         elif nodeid in self.sensor_vars:
             self.sensor_vars[nodeid]["value"] = value
+
+    async def write(self, nodeid: str, value: Any):
+        node = self._node(nodeid)
+        value = self._coerce(nodeid, value)
+        await node.write_value(value)
+        self._remember(nodeid, value)
         return True
 
     async def write_bulk(self, writes: Dict[str, Any]):
-        for nid, val in writes.items():
-            await self.write(nid, val)
+        """
+        All `writes` in a single OPC-UA Write request (one round-trip instead of one per node).
+        Raises on the first bad status, like write(); values that did go through are cached.
+        """
+        if not writes:
+            return True
+        items = [(nid, self._coerce(nid, val)) for nid, val in writes.items()]
+        params = ua.WriteParameters()
+        for nid, val in items:
+            wv = ua.WriteValue()
+            wv.NodeId = self._node(nid).nodeid
+            wv.AttributeId = ua.AttributeIds.Value
+            wv.Value = ua.DataValue(ua.Variant(val))
+            params.NodesToWrite.append(wv)
+        results = await self.client.uaclient.write(params)
+        for (nid, val), status in zip(items, results):
+            if status.is_good():
+                self._remember(nid, val)
+        for status in results:
+            status.check()
         return True
 
     async def call_method(self, method_nodeid: str, args: Optional[List[Any]] = None):
         if args is None:
             args = []
-        node = self.client.get_node(method_nodeid)
+        node = self._node(method_nodeid)
         parent = await node.get_parent()
         return await parent.call_method(node, *args)
\ No newline at end of file
@@ -15,13 +15,29 @@ Postgres connection options:
 - REACTORS_PG_HOST: optional (socket/host)
 - REACTORS_PG_PORT: optional
 - REACTORS_PG_PASSWORD: optional
+
+Connections come from a psycopg_pool.ConnectionPool when psycopg_pool is installed.
 """
 
 from __future__ import annotations
 
+import atexit
+import functools
 import os
 import sqlite3
-from typing import Any, Optional, Sequence
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Sequence, Union
+
+from db_common import (
+    SQLITE_PRAGMAS,
+    ensure_experiment_tags,
+    ensure_hypertable,
+    new_tag_pairs,
+    register_tags_sql,
+    sqlite_epoch_ts,
+    sqlite_ts,
+)
 
 # ----------------------------
 # Backend selection
@@ -40,13 +56,44 @@ PG_PASSWORD = os.getenv("REACTORS_PG_PASSWORD", "")
 # ----------------------------
 # SQLite (legacy / optional)
 # ----------------------------
-def _sqlite_connect() -> sqlite3.Connection:
-    os.makedirs(os.path.dirname(SQLITE_PATH), exist_ok=True)
-    con = sqlite3.connect(SQLITE_PATH, check_same_thread=False)
-    con.row_factory = sqlite3.Row
+_TLS = threading.local()
+
+# (experiment_id, tag) pairs this process has committed to each backend's experiment_tags
+# (shared with db_pg.py, whose list_tags reads it)
+_REGISTERED_TAGS = {"postgres": set(), "sqlite": set()}
+
+
+def _sqlite_open(path: str) -> sqlite3.Connection:
+    # one connection per file per thread, kept for the thread's life: pragmas are paid once,
+    # the page cache stays warm, and threads never interleave statements inside each other's
+    # transactions. `with con:` below only scopes a transaction, it does not close.
+    conns = getattr(_TLS, "conns", None)
+    if conns is None:
+        conns = _TLS.conns = {}
+    con = conns.get(path)
+    if con is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        con = sqlite3.connect(path)
+        con.row_factory = sqlite3.Row
+        for pragma in SQLITE_PRAGMAS:
+            con.execute(pragma)
+        conns[path] = con
     return con
 
 
+def _sqlite_connect() -> sqlite3.Connection:
+    return _sqlite_open(SQLITE_PATH)
+
+
+@functools.lru_cache(maxsize=None)
+def _sqlite_epoch_ts(path: str) -> bool:
+    return sqlite_epoch_ts(_sqlite_open(path))
+
+
+def _sqlite_ts(ts: Union[str, datetime]):
+    return sqlite_ts(ts, _sqlite_epoch_ts(SQLITE_PATH))
+
+
 def ensure_db_sqlite() -> None:
     with _sqlite_connect() as con:
         con.execute(
@@ -64,7 +111,7 @@ def ensure_db_sqlite() -> None:
             CREATE TABLE IF NOT EXISTS samples (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 experiment_id INTEGER NOT NULL,
-                ts_utc TEXT NOT NULL,
+                ts_utc INTEGER NOT NULL,      -- epoch milliseconds
                 nodeid TEXT NOT NULL,
                 tag TEXT NOT NULL,
                 value REAL,
@@ -72,6 +119,7 @@ def ensure_db_sqlite() -> None:
             )
             """
         )
+        ensure_experiment_tags(con, sqlite=True)
         con.execute(
             """
             CREATE TABLE IF NOT EXISTS calibrations (
@@ -89,9 +137,15 @@ def ensure_db_sqlite() -> None:
             """
         )
         con.execute("CREATE INDEX IF NOT EXISTS idx_samples_exp_ts ON samples(experiment_id, ts_utc)")
+        # covering index for load_timeseries (range scan per tag, no table lookups);
+        # its (experiment_id, tag) prefix also serves list_tags' DISTINCT
+        con.execute("CREATE INDEX IF NOT EXISTS idx_samples_exp_tag_ts ON samples(experiment_id, tag, ts_utc, value)")
         con.execute("CREATE INDEX IF NOT EXISTS idx_samples_tag ON samples(tag)")
         con.execute("CREATE INDEX IF NOT EXISTS idx_cal_sensor_ts ON calibrations(reactor, sensor, ts_utc)")
         con.commit()
+        # refresh planner stats so the covering index is chosen once the table has data
+        con.execute("PRAGMA optimize")
+    _sqlite_epoch_ts.cache_clear()
 
 
 def create_experiment_sqlite(name: str, reactor: str, started_at_utc: str) -> int:
@@ -105,14 +159,33 @@ def create_experiment_sqlite(name: str, reactor: str, started_at_utc: str) -> in
 
 
 def insert_sample_sqlite(
-    experiment_id: int, ts_utc: str, nodeid: str, tag: str, value: Optional[float]
+    experiment_id: int, ts_utc: Union[str, datetime], nodeid: str, tag: str, value: Optional[float]
 ) -> None:
+    new = new_tag_pairs(_REGISTERED_TAGS["sqlite"], [(experiment_id, tag)])
     with _sqlite_connect() as con:
+        if new:
+            con.executemany(register_tags_sql("?"), new)
         con.execute(
             "INSERT INTO samples (experiment_id, ts_utc, nodeid, tag, value) VALUES (?, ?, ?, ?, ?)",
-            (experiment_id, ts_utc, nodeid, tag, value),
+            (experiment_id, _sqlite_ts(ts_utc), nodeid, tag, value),
+        )
+        con.commit()
+    _REGISTERED_TAGS["sqlite"].update(new)
+
+
+def insert_samples_sqlite(rows: Sequence[tuple]) -> None:
+    # one transaction for the whole batch (new tags included) instead of a commit per row
+    rows = list(rows)
+    new = new_tag_pairs(_REGISTERED_TAGS["sqlite"], [(r[0], r[3]) for r in rows])
+    with _sqlite_connect() as con:
+        if new:
+            con.executemany(register_tags_sql("?"), new)
+        con.executemany(
+            "INSERT INTO samples (experiment_id, ts_utc, nodeid, tag, value) VALUES (?, ?, ?, ?, ?)",
+            [(e, _sqlite_ts(ts), nid, tag, v) for e, ts, nid, tag, v in rows],
         )
         con.commit()
+    _REGISTERED_TAGS["sqlite"].update(new)
 
 
 def insert_calibration_sqlite(
@@ -141,10 +214,44 @@ def insert_calibration_sqlite(
 # ----------------------------
 # PostgreSQL (primary)
 # ----------------------------
+@functools.lru_cache(maxsize=None)
+def _pg_kwargs() -> dict[str, Any]:
+    # connection parameters, resolved from the REACTORS_PG_* env vars once
+    import pwd
+
+    user = PG_USER or pwd.getpwuid(os.getuid())[0]
+
+    kwargs: dict[str, Any] = {"dbname": PG_DBNAME, "user": user}
+    if PG_HOST:
+        kwargs["host"] = PG_HOST
+    if PG_PORT:
+        kwargs["port"] = PG_PORT
+    if PG_PASSWORD:
+        kwargs["password"] = PG_PASSWORD
+    return kwargs
+
+
+@functools.lru_cache(maxsize=None)
+def _pg_pool():
+    """
+    Process-wide psycopg_pool.ConnectionPool, opened on first use and closed at exit.
+    None when psycopg_pool isn't installed (callers then fall back to one connection per call).
+    """
+    try:
+        from psycopg_pool import ConnectionPool
+    except Exception:
+        return None
+    pool = ConnectionPool(kwargs={**_pg_kwargs(), "autocommit": False}, min_size=2, max_size=16, open=True)
+    atexit.register(pool.close)
+    return pool
+
+
 def _pg_connect():
+    """
+    Context manager yielding a Postgres connection: borrowed from the pool (returned, and
+    committed unless the block raised, on exit) or, without psycopg_pool, a fresh one.
+    """
     try:
-        import pwd
-        import os as _os
         import psycopg
     except Exception as e:
         raise RuntimeError(
@@ -152,17 +259,31 @@ def _pg_connect():
             'Install with: pip install "psycopg[binary]"'
         ) from e
 
-    user = PG_USER or pwd.getpwuid(_os.getuid())[0]
+    pool = _pg_pool()
+    if pool is not None:
+        return pool.connection()
+    return psycopg.connect(**_pg_kwargs())
 
-    kwargs: dict[str, Any] = {"dbname": PG_DBNAME, "user": user}
-    if PG_HOST:
-        kwargs["host"] = PG_HOST
-    if PG_PORT:
-        kwargs["port"] = PG_PORT
-    if PG_PASSWORD:
-        kwargs["password"] = PG_PASSWORD
 
-    return psycopg.connect(**kwargs)
+def _restore_text_samples_pg(cur) -> None:
+    """
+    samples is shared with db_pg.py and gui.py, which read and write the TEXT tag/nodeid
+    columns, so that is the one layout. Databases touched by the short-lived interning
+    migration get it back: text columns refilled from tags/nodes where they were dropped,
+    then the tag_id/node_id columns and the samples_fill_ids trigger removed. No-op on
+    text-only tables; a failure raises rather than leaving readers on a half layout.
+    """
+    cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'samples'")
+    cols = {c for (c,) in cur.fetchall()}
+    if "tag_id" not in cols and "node_id" not in cols:
+        return
+    if "tag" not in cols or "nodeid" not in cols:
+        cur.execute("ALTER TABLE samples ADD COLUMN IF NOT EXISTS tag TEXT, ADD COLUMN IF NOT EXISTS nodeid TEXT")
+        cur.execute("UPDATE samples s SET tag = t.name FROM tags t WHERE s.tag_id = t.id AND s.tag IS NULL")
+        cur.execute("UPDATE samples s SET nodeid = n.nodeid FROM nodes n WHERE s.node_id = n.id AND s.nodeid IS NULL")
+    cur.execute("DROP TRIGGER IF EXISTS samples_fill_ids ON samples")
+    cur.execute("DROP FUNCTION IF EXISTS samples_fill_ids()")
+    cur.execute("ALTER TABLE samples DROP COLUMN IF EXISTS tag_id, DROP COLUMN IF EXISTS node_id")
 
 
 def ensure_db_pg() -> None:
@@ -196,6 +317,8 @@ def ensure_db_pg() -> None:
                 )
                 """
             )
+            _restore_text_samples_pg(cur)
+            ensure_experiment_tags(cur, sqlite=False)
             cur.execute(
                 """
                 CREATE TABLE IF NOT EXISTS calibrations (
@@ -212,7 +335,16 @@ def ensure_db_pg() -> None:
                 )
                 """
             )
+            try:
+                # savepoint: a missing privilege must not abort the rest of the schema setup
+                with con.transaction():
+                    ensure_hypertable(cur)
+            except Exception:
+                pass
             cur.execute("CREATE INDEX IF NOT EXISTS idx_samples_exp_ts ON samples(experiment_id, ts_utc)")
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS idx_samples_exp_tag_ts ON samples(experiment_id, tag, ts_utc) INCLUDE (value)"
+            )
             cur.execute("CREATE INDEX IF NOT EXISTS idx_samples_tag ON samples(tag)")
             cur.execute("CREATE INDEX IF NOT EXISTS idx_cal_sensor_ts ON calibrations(reactor, sensor, ts_utc)")
         con.commit()
@@ -237,16 +369,35 @@ def create_experiment_pg(name: str, reactor: str, started_at_utc: str) -> int:
 def insert_sample_pg(
     experiment_id: int, ts_utc: str, nodeid: str, tag: str, value: Optional[float]
 ) -> None:
+    new = new_tag_pairs(_REGISTERED_TAGS["postgres"], [(experiment_id, tag)])
     with _pg_connect() as con:
         with con.cursor() as cur:
+            if new:
+                cur.executemany(register_tags_sql("%s"), new)
             cur.execute(
                 """
                 INSERT INTO samples (experiment_id, ts_utc, nodeid, tag, value)
                 VALUES (%s, %s, %s, %s, %s)
                 """,
                 (experiment_id, ts_utc, nodeid, tag, value),
+                prepare=True,  # hot path: parse/plan once per connection
             )
         con.commit()
+    _REGISTERED_TAGS["postgres"].update(new)
+
+
+def insert_samples_pg(rows: Sequence[tuple]) -> None:
+    # COPY streams the whole batch in one statement (no per-row parse/round-trip)
+    rows = list(rows)
+    new = new_tag_pairs(_REGISTERED_TAGS["postgres"], [(r[0], r[3]) for r in rows])
+    with _pg_connect() as con:
+        with con.cursor() as cur:
+            if new:
+                cur.executemany(register_tags_sql("%s"), new)
+            with cur.copy("COPY samples (experiment_id, ts_utc, nodeid, tag, value) FROM STDIN") as cp:
+                for r in rows:
+                    cp.write_row(r)
+        con.commit()
 
 
 def insert_calibration_pg(
@@ -269,6 +420,7 @@ def insert_calibration_pg(
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """,
                 (ts_utc, reactor, sensor, int(cp), float(point), float(input_value), str(status), quality, output_value),
+                prepare=True,
             )
         con.commit()
 
@@ -306,45 +458,75 @@ def list_tags(experiment_id: int) -> list[str]:
         try:
             with _sqlite_connect() as con:
                 rows = con.execute(
-                    "SELECT DISTINCT tag FROM samples WHERE experiment_id = ? ORDER BY tag",
+                    "SELECT DISTINCT tag FROM samples WHERE experiment_id = ? AND tag <> '' ORDER BY tag",
                     (experiment_id,),
                 ).fetchall()
-            return [r["tag"] for r in rows if r["tag"]]
+            return [t for (t,) in rows]
         except Exception:
             return []
 
     with _pg_connect() as con:
         with con.cursor() as cur:
             cur.execute(
-                "SELECT DISTINCT tag FROM samples WHERE experiment_id = %s ORDER BY tag",
+                "SELECT DISTINCT tag FROM samples WHERE experiment_id = %s AND tag <> '' ORDER BY tag",
                 (experiment_id,),
             )
             rows = cur.fetchall()
-    return [r[0] for r in rows if r and r[0]]
+    return [t for (t,) in rows]
+
+
+@functools.lru_cache(maxsize=32)
+def _sqlite_timeseries_query(n_tags: int, epoch: bool, bucketed: bool) -> str:
+    """
+    SQL text for the sqlite load_timeseries, built once per (tag count, schema, bucketing).
+    Identical text on every call also lets sqlite3's statement cache reuse the compiled plan.
+    Bucketed queries take the bucket step twice ahead of the usual parameters.
+    """
+    # epoch rows compare as integers and are formatted back to ISO text by sqlite itself
+    if bucketed:
+        if epoch:
+            ts_col = "strftime('%Y-%m-%dT%H:%M:%f+00:00', (ts_utc / ?) * ? / 1000.0, 'unixepoch')"
+        else:
+            ts_col = "strftime('%Y-%m-%dT%H:%M:%S+00:00', (CAST(strftime('%s', ts_utc) AS INTEGER) / ?) * ?, 'unixepoch')"
+        select, group = f"{ts_col} AS ts_utc, tag, AVG(value) AS value", "GROUP BY 1, tag"
+    else:
+        ts_col = "strftime('%Y-%m-%dT%H:%M:%f+00:00', ts_utc / 1000.0, 'unixepoch')" if epoch else "ts_utc"
+        select, group = f"{ts_col} AS ts_utc, tag, value", ""
+    placeholders = ",".join(["?"] * n_tags)
+    return f"""
+        SELECT {select}
+        FROM samples
+        WHERE experiment_id = ?
+          AND ts_utc >= ?
+          AND tag IN ({placeholders})
+        {group}
+        ORDER BY 1 ASC
+    """
 
 
-def load_timeseries(experiment_id: int, tags: Sequence[str], minutes: int) -> list[dict[str, Any]]:
+def load_timeseries(
+    experiment_id: int, tags: Sequence[str], minutes: int, max_points: int = 0
+) -> list[dict[str, Any]]:
     """
     Returns list of dict rows: {ts_utc, tag, value}
     Filters to last N minutes.
+    With max_points > 0, values are averaged per (time bucket, tag) in SQL, with the bucket
+    width chosen so each tag returns at most max_points rows.
     """
     if not tags:
         return []
+    bucket = max(1, int(minutes) * 60 // int(max_points)) if max_points and max_points > 0 else 0
+    # bound as a plain parameter on both backends, so the ts_utc range is an index seek
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=int(minutes))
 
     if DB_BACKEND == "sqlite":
         try:
-            from datetime import datetime, timedelta, timezone
-            cutoff = datetime.now(timezone.utc) - timedelta(minutes=int(minutes))
-            placeholders = ",".join(["?"] * len(tags))
-            params = [experiment_id, cutoff.isoformat(), *tags]
-            q = f"""
-                SELECT ts_utc, tag, value
-                FROM samples
-                WHERE experiment_id = ?
-                  AND ts_utc >= ?
-                  AND tag IN ({placeholders})
-                ORDER BY ts_utc ASC
-            """
+            params = [experiment_id, _sqlite_ts(cutoff), *tags]
+            epoch = _sqlite_epoch_ts(SQLITE_PATH)
+            if bucket:
+                step = bucket * 1000 if epoch else bucket
+                params = [step, step, *params]
+            q = _sqlite_timeseries_query(len(tags), epoch, bool(bucket))
             with _sqlite_connect() as con:
                 rows = con.execute(q, params).fetchall()
             return [dict(r) for r in rows]
@@ -352,18 +534,25 @@ def load_timeseries(experiment_id: int, tags: Sequence[str], minutes: int) -> li
             return []
 
     # postgres
+    if bucket:
+        select = "to_timestamp(floor(extract(epoch FROM ts_utc) / %s) * %s) AS ts_utc, tag, AVG(value) AS value"
+        group, params = "GROUP BY 1, tag", (bucket, bucket, experiment_id, cutoff, list(tags))
+    else:
+        select, group = "ts_utc, tag, value", ""
+        params = (experiment_id, cutoff, list(tags))
     with _pg_connect() as con:
         with con.cursor() as cur:
             cur.execute(
-                """
-                SELECT ts_utc, tag, value
+                f"""
+                SELECT {select}
                 FROM samples
                 WHERE experiment_id = %s
-                  AND ts_utc >= (NOW() AT TIME ZONE 'utc') - (%s || ' minutes')::interval
+                  AND ts_utc >= %s
                   AND tag = ANY(%s)
-                ORDER BY ts_utc ASC
+                {group}
+                ORDER BY 1 ASC
                 """,
-                (experiment_id, int(minutes), list(tags)),
+                params,
             )
             rows = cur.fetchall()
     return [{"ts_utc": str(ts), "tag": tag, "value": val} for (ts, tag, val) in rows]
@@ -433,12 +622,21 @@ def create_experiment(name: str, reactor: str, started_at_utc: str) -> int:
     return create_experiment_pg(name, reactor, started_at_utc)
 
 
-def insert_sample(experiment_id: int, ts_utc: str, nodeid: str, tag: str, value: Optional[float]) -> None:
+def insert_sample(experiment_id: int, ts_utc: Union[str, datetime], nodeid: str, tag: str, value: Optional[float]) -> None:
     if DB_BACKEND == "sqlite":
         return insert_sample_sqlite(experiment_id, ts_utc, nodeid, tag, value)
     return insert_sample_pg(experiment_id, ts_utc, nodeid, tag, value)
 
 
+def insert_samples(rows: Sequence[tuple]) -> None:
+    """Bulk insert of (experiment_id, ts_utc, nodeid, tag, value) rows, one transaction."""
+    if not rows:
+        return
+    if DB_BACKEND == "sqlite":
+        return insert_samples_sqlite(rows)
+    return insert_samples_pg(rows)
+
+
 def insert_calibration(
     ts_utc: str,
     reactor: str,
@@ -0,0 +1,124 @@
+# db_common.py
+"""
+Pieces shared by db.py and db_pg.py, which read and write the same sqlite file / Postgres
+database and therefore must agree on its layout:
+- SQLITE_PRAGMAS -- applied once per opened sqlite connection
+- epoch_ms(ts) -> int; naive timestamps are taken as UTC, like everything in samples
+- sqlite_epoch_ts(con) -> True when samples.ts_utc holds INTEGER epoch milliseconds
+- sqlite_ts(ts, epoch) -> timestamp in the representation that samples table uses
+- ensure_hypertable(cur) -> Postgres samples as a TimescaleDB hypertable, when available
+- ensure_experiment_tags(cur, sqlite) / new_tag_pairs / register_tags_sql -- the per-experiment
+  tag list every samples writer keeps up to date
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+from typing import Union
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+
+def epoch_ms(ts: Union[str, datetime]) -> int:
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    if ts.tzinfo is None:
+        # .timestamp() would read a naive value as local time; the sqlite migration's
+        # julianday() and the rest of the schema treat it as UTC
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def sqlite_epoch_ts(con: sqlite3.Connection) -> bool:
+    """
+    True when samples.ts_utc is INTEGER epoch milliseconds (current schema).
+    Files created before that keep ISO-8601 text and are still read/written as text.
+    """
+    cols = con.execute("PRAGMA table_info(samples)").fetchall()
+    return any(c[1] == "ts_utc" and (c[2] or "").upper() == "INTEGER" for c in cols)
+
+
+def sqlite_ts(ts: Union[str, datetime], epoch: bool):
+    """Timestamp in the representation the sqlite samples table uses (`epoch` from sqlite_epoch_ts)."""
+    if epoch:
+        return epoch_ms(ts)
+    return ts if isinstance(ts, str) else ts.isoformat()
+
+
+def ensure_experiment_tags(cur, sqlite: bool) -> None:
+    """
+    Create experiment_tags, the distinct tags per experiment that list_tags reads instead of
+    scanning samples. When the table is new it is filled once from samples, so experiments
+    logged before it existed (or by a writer that didn't register) are complete from the start.
+    """
+    if sqlite:
+        exists = cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'experiment_tags'").fetchone()
+    else:
+        exists = cur.execute("SELECT to_regclass('experiment_tags')").fetchone()[0]
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS experiment_tags (
+            experiment_id INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (experiment_id, tag)
+        )"""
+        + (" WITHOUT ROWID" if sqlite else "")
+    )
+    if not exists:
+        cur.execute(
+            "INSERT INTO experiment_tags (experiment_id, tag) "
+            "SELECT DISTINCT experiment_id, tag FROM samples "
+            "WHERE experiment_id IS NOT NULL AND tag IS NOT NULL AND tag <> '' ON CONFLICT DO NOTHING"
+        )
+
+
+def register_tags_sql(placeholder: str) -> str:
+    # same statement for both backends; sqlite >= 3.24 understands ON CONFLICT DO NOTHING
+    return f"INSERT INTO experiment_tags (experiment_id, tag) VALUES ({placeholder}, {placeholder}) ON CONFLICT DO NOTHING"
+
+
+def new_tag_pairs(registered: set, pairs) -> list:
+    """(experiment_id, tag) pairs from `pairs` not yet in `registered`, deduplicated, in order."""
+    return [p for p in dict.fromkeys(pairs) if p[1] and p not in registered]
+
+
+# connections (by DSN) this process has already tried to convert samples for
+_HYPERTABLE_TRIED: set = set()
+
+
+def ensure_hypertable(cur) -> bool:
+    """
+    Make samples a TimescaleDB hypertable on ts_utc (1-day chunks) when the extension is
+    installed on the server; plain table otherwise. Existing rows are migrated on the first
+    call. Shared by db.py and db_pg.py, whose ensure_db runs on every Streamlit rerun, so
+    it is attempted at most once per database per process: a server where the extension
+    can't be created is not retried (or reported) again on each rerun.
+
+    Changes the shared samples primary key from (id) to (id, ts_utc). id stays a serial, so
+    rows remain unique in practice, but nothing may rely on ON CONFLICT (id) against
+    samples (neither module does: samples inserts are plain INSERT / COPY).
+    """
+    dsn = cur.connection.info.dsn
+    if dsn in _HYPERTABLE_TRIED:
+        return False
+    _HYPERTABLE_TRIED.add(dsn)
+    cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb'")
+    if cur.fetchone() is None:
+        return False
+    cur.execute("CREATE EXTENSION IF NOT EXISTS timescaledb")
+    cur.execute("SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = 'samples'")
+    if cur.fetchone() is not None:
+        return True
+    # unique constraints on a hypertable must include the partitioning column
+    cur.execute("ALTER TABLE samples DROP CONSTRAINT IF EXISTS samples_pkey")
+    cur.execute("ALTER TABLE samples ADD PRIMARY KEY (id, ts_utc)")
+    cur.execute(
+        "SELECT create_hypertable('samples', 'ts_utc', chunk_time_interval => INTERVAL '1 day', "
+        "if_not_exists => TRUE, migrate_data => TRUE)"
+    )
+    return True
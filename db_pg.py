@@ -4,38 +4,155 @@ Postgres-backed DB helper with SQLite fallback.
 Functions used by sampler.py and app.py:
 - ensure_db()
 - create_experiment(name, reactor, started_at_utc) -> id
-- insert_sample(experiment_id, ts_iso, nodeid, tag, value)
+- insert_sample(experiment_id, ts_utc, nodeid, tag, value)
+- insert_samples(rows) -- bulk (experiment_id, ts_utc, nodeid, tag, value)
+- SampleWriter(max_rows, max_age_s) -- buffered insert_samples, flushed by size/age
+- register_tags(experiment_id, tags)
 - insert_calibration(record dict) -> id
 - list_experiments() -> list of dicts
 - list_tags(experiment_id) -> list of tags
-- load_timeseries(experiment_id, tags, minutes) -> pandas.DataFrame
+- load_timeseries(experiment_id, tags, minutes, bucket_seconds=0, limit=0) -> pandas.DataFrame
 - list_calibrations(reactor=None, sensor=None) -> list of dicts
+- migrate_sqlite_samples() -- one-off: `python db_pg.py migrate-sqlite`
 """
 
+import contextlib
+import functools
+import json
+import math
 import os
 import pwd
 import sqlite3
+import time
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
+
+from db_common import (
+    SQLITE_PRAGMAS,
+    ensure_experiment_tags,
+    ensure_hypertable,
+    new_tag_pairs,
+    register_tags_sql,
+    sqlite_epoch_ts,
+    sqlite_ts,
+)
 
 try:
     import psycopg
+    from psycopg import sql
     HAS_PSYCOPG = True
 except Exception:
     HAS_PSYCOPG = False
 
+try:
+    # optional: reads the time-series query (Postgres or sqlite file) straight into Arrow buffers
+    import connectorx as cx
+    HAS_CONNECTORX = True
+except Exception:
+    HAS_CONNECTORX = False
+
+# optional libpq URI, e.g. postgresql://user@localhost:5432/bioreactor_db
+# (overrides BIO_DBNAME + OS user; required for the connectorx read path)
+PG_DSN = os.environ.get("BIO_PG_DSN", "")
+
 # default sqlite path (used as fallback)
 SQLITE_PATH = os.environ.get("STAGE2_SQLITE", "data/stage2.sqlite")
 
+# shared by both backends; (experiment_id, tag, ts_utc, value) covers load_timeseries
+SAMPLE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_samples_exp_tag_ts ON samples(experiment_id, tag, ts_utc, value)",
+    "CREATE INDEX IF NOT EXISTS ix_samples_exp_ts ON samples(experiment_id, ts_utc DESC)",
+)
+
+
 # Postgres connection helper — follow Alexis example
 def get_pg_conn():
     if not HAS_PSYCOPG:
         raise RuntimeError("psycopg not installed")
+    if PG_DSN:
+        return psycopg.connect(PG_DSN)
     username = pwd.getpwuid(os.getuid())[0]
     dbname = os.environ.get("BIO_DBNAME", "bioreactor_db")
     return psycopg.connect(dbname=dbname, user=username)
 
 
+@functools.lru_cache(maxsize=None)
+def _pg_shared_conn():
+    conn = get_pg_conn()
+    conn.autocommit = True
+    return conn
+
+
+@contextlib.contextmanager
+def _pg_conn():
+    """
+    The process-wide autocommit Postgres connection, so successive reads in one rerun
+    (experiments, tags, time series) reuse one session instead of reconnecting each time.
+    Reopened on the next use if it was closed or broke.
+    """
+    conn = _pg_shared_conn()
+    if conn.closed or conn.broken:
+        _pg_shared_conn.cache_clear()
+        conn = _pg_shared_conn()
+    yield conn
+
+
+@functools.lru_cache(maxsize=None)
+def _sqlite_conn(path: str) -> sqlite3.Connection:
+    """
+    One persistent sqlite connection per db path, shared by every caller in the process
+    (Streamlit reruns, sampler loop). Autocommit mode, so no explicit commit() is needed.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    con = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    for pragma in SQLITE_PRAGMAS:
+        con.execute(pragma)
+    return con
+
+
+@functools.lru_cache(maxsize=None)
+def _sqlite_epoch_ts(path: str) -> bool:
+    return sqlite_epoch_ts(_sqlite_conn(path))
+
+
+def _sqlite_ts(ts: Union[str, datetime]):
+    return sqlite_ts(ts, _sqlite_epoch_ts(SQLITE_PATH))
+
+
+def _sqlite_literal(v) -> str:
+    # sqlite string literals have no backslash escapes, so doubling ' is the whole rule
+    if isinstance(v, float) and not math.isfinite(v):
+        raise ValueError("no sqlite literal for a non-finite float")
+    if isinstance(v, (int, float)):
+        return repr(v)
+    if isinstance(v, datetime):
+        v = v.isoformat()
+    return "'" + str(v).replace("'", "''") + "'"
+
+
+def _cx_read_pg(query: str, params: List[Any]):
+    """
+    Run a %s-parameterised Postgres query through connectorx. connectorx has no bind
+    parameters, so values are inlined with psycopg's own quoting (sql.Literal, which follows
+    the server's string settings); the query text must contain no other %.
+    """
+    with _pg_conn() as conn:
+        inlined = query % tuple(sql.Literal(p).as_string(conn) for p in params)
+    return cx.read_sql(PG_DSN, inlined, return_type="pandas")
+
+
+def _cx_read_sqlite(query: str, params: List[Any]):
+    """
+    Same as _cx_read_pg for the sqlite file: ?-placeholders are replaced by quoted literals
+    in order (query text must contain no other ?).
+    """
+    parts = query.split("?")
+    if len(parts) != len(params) + 1:
+        raise ValueError("placeholder/parameter count mismatch")
+    inlined = parts[0] + "".join(_sqlite_literal(p) + part for p, part in zip(params, parts[1:]))
+    return cx.read_sql(f"sqlite://{os.path.abspath(SQLITE_PATH)}", inlined, return_type="pandas")
+
+
 # ---------- convenience wrappers (try Postgres, else fallback to sqlite) ----------
 def ensure_db():
     """
@@ -43,7 +160,7 @@ def ensure_db():
     """
     if HAS_PSYCOPG:
         try:
-            with get_pg_conn() as conn:
+            with _pg_conn() as conn:
                 cur = conn.cursor()
                 # experiments
                 cur.execute(
@@ -69,6 +186,8 @@ def ensure_db():
                     )
                     """
                 )
+                # distinct tags per experiment, so list_tags never scans samples
+                ensure_experiment_tags(cur, sqlite=False)
                 # calibrations
                 cur.execute(
                     """
@@ -87,6 +206,13 @@ def ensure_db():
                     )
                     """
                 )
+                try:
+                    with conn.transaction():
+                        ensure_hypertable(cur)
+                except Exception as e:
+                    print(f"[db_pg] TimescaleDB hypertable not set up, samples stays a plain table: {e}")
+                for ddl in SAMPLE_INDEXES:
+                    cur.execute(ddl)
                 conn.commit()
                 return "postgres"
         except Exception as e:
@@ -97,9 +223,82 @@ def ensure_db():
     return "sqlite"
 
 
+# samples clustered on (experiment_id, tag, ts_utc, nodeid): the table b-tree is then the
+# load_timeseries index, with no rowid tree beside it. nodeid is part of the key so two
+# nodes logging one tag in the same millisecond keep both rows; '' stands for "no node".
+# STRICT needs sqlite >= 3.37.
+_SQLITE_SAMPLES_DDL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        experiment_id INTEGER NOT NULL,
+        ts_utc INTEGER NOT NULL,  -- epoch milliseconds
+        nodeid TEXT NOT NULL DEFAULT '',
+        tag TEXT NOT NULL,
+        value REAL,
+        PRIMARY KEY (experiment_id, tag, ts_utc, nodeid)
+    ) WITHOUT ROWID""" + (", STRICT" if sqlite3.sqlite_version_info >= (3, 37, 0) else "")
+
+# an exact repeat of (experiment, tag, ms, node) is a re-delivered reading: the first one stays
+_SQLITE_INSERT_SAMPLE = (
+    "INSERT INTO samples (experiment_id, ts_utc, nodeid, tag, value) "
+    "VALUES (?, ?, COALESCE(?, ''), ?, ?) ON CONFLICT DO NOTHING"
+)
+
+
+def _sqlite_samples_legacy(con: sqlite3.Connection) -> bool:
+    # an existing samples table whose primary key doesn't include nodeid: the rowid table with
+    # an id column (ISO-text or epoch timestamps), or the clustered table keyed without nodeid
+    cols = {c[1]: c for c in con.execute("PRAGMA table_info(samples)").fetchall()}
+    return bool(cols) and not cols.get("nodeid", (None,) * 6)[5]
+
+
+def migrate_sqlite_samples() -> bool:
+    """
+    One-off copy of an older-layout sqlite samples table into the clustered one: samples_new,
+    INSERT ... SELECT, drop, rename. Rows without experiment, tag or a parseable timestamp
+    are not copied; naive ISO timestamps are read as UTC (as epoch_ms does). Run it while
+    the app and sampler are stopped: `python db_pg.py migrate-sqlite`. BEGIN IMMEDIATE takes
+    the write lock before the layout is re-checked, so a second run waits and then finds
+    nothing to do. Returns True when a table was converted.
+    """
+    con = _sqlite_conn(SQLITE_PATH)
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        if not _sqlite_samples_legacy(con):
+            con.execute("COMMIT")
+            return False
+        con.execute("DROP TABLE IF EXISTS samples_new")
+        con.execute(_SQLITE_SAMPLES_DDL.format(name="samples_new"))
+        con.execute(
+            """
+            INSERT INTO samples_new (experiment_id, ts_utc, nodeid, tag, value)
+            SELECT experiment_id, ts, COALESCE(nodeid, ''), tag, CAST(value AS REAL)
+            FROM (
+                SELECT experiment_id, nodeid, tag, value,
+                       CASE WHEN typeof(ts_utc) = 'integer' THEN ts_utc
+                            ELSE CAST(round((julianday(ts_utc) - 2440587.5) * 86400000) AS INTEGER)
+                       END AS ts
+                FROM samples
+            )
+            WHERE experiment_id IS NOT NULL AND tag IS NOT NULL AND ts IS NOT NULL
+            ON CONFLICT DO NOTHING
+            """
+        )
+        con.execute("DROP TABLE samples")
+        con.execute("ALTER TABLE samples_new RENAME TO samples")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    con.execute("COMMIT")
+    _ensure_sqlite()  # indexes went with the old table
+    return True
+
+
+# sqlite paths already told about migrate_sqlite_samples, so reruns don't repeat it
+_LEGACY_NOTED = set()
+
+
 def _ensure_sqlite():
-    os.makedirs(os.path.dirname(SQLITE_PATH) or ".", exist_ok=True)
-    con = sqlite3.connect(SQLITE_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
+    con = _sqlite_conn(SQLITE_PATH)
     cur = con.cursor()
     cur.execute(
         """
@@ -111,18 +310,14 @@ def _ensure_sqlite():
         )
         """
     )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS samples (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            experiment_id INTEGER,
-            ts_utc TEXT,
-            nodeid TEXT,
-            tag TEXT,
-            value REAL
-        )
-        """
-    )
+    # older files keep their layout (both insert paths work on it) until migrated explicitly:
+    # a full-table copy here would block every importer of this module
+    legacy = _sqlite_samples_legacy(con)
+    if legacy and SQLITE_PATH not in _LEGACY_NOTED:
+        _LEGACY_NOTED.add(SQLITE_PATH)
+        print(f"[db_pg] {SQLITE_PATH} uses the old samples layout; `python db_pg.py migrate-sqlite` converts it")
+    cur.execute(_SQLITE_SAMPLES_DDL.format(name="samples"))
+    ensure_experiment_tags(cur, sqlite=True)
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS calibrations (
@@ -140,8 +335,11 @@ def _ensure_sqlite():
         )
         """
     )
-    con.commit()
-    con.close()
+    for ddl in SAMPLE_INDEXES:
+        if not legacy and "ix_samples_exp_tag_ts" in ddl:
+            continue  # same key as the clustered primary key
+        cur.execute(ddl)
+    _sqlite_epoch_ts.cache_clear()
 
 
 # ---------- experiment/sample helpers ----------
@@ -149,7 +347,7 @@ def create_experiment(name: str, reactor: str, started_at_utc: str) -> int:
     """Create experiment record and return id. Try Postgres first, fallback to sqlite."""
     if HAS_PSYCOPG:
         try:
-            with get_pg_conn() as conn:
+            with _pg_conn() as conn:
                 cur = conn.cursor()
                 cur.execute(
                     "INSERT INTO experiments (name, reactor, started_at_utc) VALUES (%s,%s,%s) RETURNING id",
@@ -161,40 +359,139 @@ def create_experiment(name: str, reactor: str, started_at_utc: str) -> int:
         except Exception:
             pass
 
-    con = sqlite3.connect(SQLITE_PATH)
-    cur = con.cursor()
-    cur.execute(
+    cur = _sqlite_conn(SQLITE_PATH).execute(
         "INSERT INTO experiments (name, reactor, started_at_utc) VALUES (?, ?, ?)",
         (name, reactor, started_at_utc),
     )
-    eid = cur.lastrowid
-    con.commit()
-    con.close()
-    return int(eid)
+    return int(cur.lastrowid)
+
 
+# (experiment_id, tag) pairs this process has written to each backend's experiment_tags;
+# a pair is only marked once the transaction that stored its samples (or the tag) commits
+_REGISTERED_TAGS = {"postgres": set(), "sqlite": set()}
 
-def insert_sample(experiment_id: int, ts_iso: str, nodeid: str, tag: str, value: float):
+
+def register_tags(experiment_id: int, tags: List[str]):
+    """Record tags in experiment_tags (idempotent). The insert helpers register their own tags."""
+    pairs = [(experiment_id, t) for t in tags]
     if HAS_PSYCOPG:
         try:
-            with get_pg_conn() as conn:
-                cur = conn.cursor()
-                cur.execute(
-                    "INSERT INTO samples (experiment_id, ts_utc, nodeid, tag, value) VALUES (%s,%s,%s,%s,%s)",
-                    (experiment_id, ts_iso, nodeid, tag, value),
-                )
-                conn.commit()
-                return
+            new = new_tag_pairs(_REGISTERED_TAGS["postgres"], pairs)
+            if new:
+                with _pg_conn() as conn:
+                    conn.cursor().executemany(register_tags_sql("%s"), new)
+            _REGISTERED_TAGS["postgres"].update(new)
+            return
         except Exception:
             pass
+    new = new_tag_pairs(_REGISTERED_TAGS["sqlite"], pairs)
+    if new:
+        _sqlite_conn(SQLITE_PATH).executemany(register_tags_sql("?"), new)
+    _REGISTERED_TAGS["sqlite"].update(new)
 
-    con = sqlite3.connect(SQLITE_PATH)
-    cur = con.cursor()
-    cur.execute(
-        "INSERT INTO samples (experiment_id, ts_utc, nodeid, tag, value) VALUES (?, ?, ?, ?, ?)",
-        (experiment_id, ts_iso, nodeid, tag, value),
-    )
-    con.commit()
-    con.close()
+
+def insert_sample(experiment_id: int, ts_utc: Union[str, datetime], nodeid: str, tag: str, value: float):
+    insert_samples([(experiment_id, ts_utc, nodeid, tag, value)])
+
+
+def insert_samples(rows: List[tuple]):
+    """
+    Insert (experiment_id, ts_utc, nodeid, tag, value) rows in one transaction on whichever
+    backend takes them: COPY on Postgres, one executemany on SQLite. Tags not yet registered
+    on that backend go into experiment_tags in the same transaction (one executemany for
+    every experiment in the batch, which psycopg pipelines).
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    pairs = [(r[0], r[3]) for r in rows]
+    if HAS_PSYCOPG:
+        try:
+            new = new_tag_pairs(_REGISTERED_TAGS["postgres"], pairs)
+            with _pg_conn() as conn:
+                with conn.transaction():
+                    cur = conn.cursor()
+                    if new:
+                        cur.executemany(register_tags_sql("%s"), new)
+                    if len(rows) == 1:
+                        # single readings (insert_sample): parse/plan once per connection
+                        cur.execute(
+                            "INSERT INTO samples (experiment_id, ts_utc, nodeid, tag, value) VALUES (%s,%s,%s,%s,%s)",
+                            rows[0],
+                            prepare=True,
+                        )
+                    else:
+                        with cur.copy("COPY samples (experiment_id, ts_utc, nodeid, tag, value) FROM STDIN") as cp:
+                            for r in rows:
+                                cp.write_row(r)
+            _REGISTERED_TAGS["postgres"].update(new)
+            return
+        except Exception:
+            pass
+
+    new = new_tag_pairs(_REGISTERED_TAGS["sqlite"], pairs)
+    con = _sqlite_conn(SQLITE_PATH)
+    # the connection is in autocommit mode; without BEGIN every row would be its own commit
+    con.execute("BEGIN")
+    try:
+        if new:
+            con.executemany(register_tags_sql("?"), new)
+        con.executemany(
+            _SQLITE_INSERT_SAMPLE, [(e, _sqlite_ts(ts), nid, tag, v) for e, ts, nid, tag, v in rows]
+        )
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    con.execute("COMMIT")
+    _REGISTERED_TAGS["sqlite"].update(new)
+
+
+class SampleWriter:
+    """
+    Buffers (experiment_id, ts_utc, nodeid, tag, value) rows and writes them with
+    insert_samples once `max_rows` are pending or the oldest is `max_age_s` old, so a fast
+    poll loop commits once per batch instead of once per tick. The age is only checked in
+    extend() and flush_if_due(): a caller that adds rows less often than every `max_age_s`
+    calls flush_if_due() at due_at() in between. Use as a context manager so the tail is
+    written on exit. A failed flush drops its rows (like a failed insert_sample).
+    """
+
+    def __init__(self, max_rows: int = 1000, max_age_s: float = 1.0):
+        self.max_rows = max_rows
+        self.max_age_s = max_age_s
+        self._buf: List[tuple] = []
+        self._first_at = 0.0
+
+    def add(self, row: tuple):
+        self.extend([row])
+
+    def extend(self, rows: List[tuple]):
+        if not rows:
+            return
+        if not self._buf:
+            self._first_at = time.monotonic()
+        self._buf.extend(rows)
+        if len(self._buf) >= self.max_rows or time.monotonic() - self._first_at >= self.max_age_s:
+            self.flush()
+
+    def due_at(self) -> float:
+        """time.monotonic() at which the buffered rows reach max_age_s (inf when empty)."""
+        return self._first_at + self.max_age_s if self._buf else float("inf")
+
+    def flush_if_due(self):
+        if self._buf and time.monotonic() >= self.due_at():
+            self.flush()
+
+    def flush(self):
+        rows, self._buf = self._buf, []
+        insert_samples(rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+        return False
 
 
 # ---------- calibration helpers ----------
@@ -212,7 +509,7 @@ def insert_calibration(
 ):
     if HAS_PSYCOPG:
         try:
-            with get_pg_conn() as conn:
+            with _pg_conn() as conn:
                 cur = conn.cursor()
                 cur.execute(
                     """
@@ -221,6 +518,7 @@ def insert_calibration(
                     VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s) RETURNING id
                     """,
                     (ts_iso, reactor, sensor, cp, point, value, status, quality, returned_value, method_nodeid),
+                    prepare=True,
                 )
                 cid = cur.fetchone()[0]
                 conn.commit()
@@ -228,9 +526,7 @@ def insert_calibration(
         except Exception:
             pass
 
-    con = sqlite3.connect(SQLITE_PATH)
-    cur = con.cursor()
-    cur.execute(
+    cur = _sqlite_conn(SQLITE_PATH).execute(
         """
         INSERT INTO calibrations
          (ts_utc, reactor, sensor, cp, point, value, status, quality, returned_value, method_nodeid)
@@ -238,16 +534,13 @@ def insert_calibration(
         """,
         (ts_iso, reactor, sensor, cp, point, value, status, quality, returned_value, method_nodeid),
     )
-    cid = cur.lastrowid
-    con.commit()
-    con.close()
-    return int(cid)
+    return int(cur.lastrowid)
 
 
 def list_experiments() -> List[Dict[str, Any]]:
     if HAS_PSYCOPG:
         try:
-            with get_pg_conn() as conn:
+            with _pg_conn() as conn:
                 cur = conn.cursor()
                 cur.execute("SELECT id, name, reactor, started_at_utc FROM experiments ORDER BY id DESC")
                 rows = cur.fetchall()
@@ -255,73 +548,162 @@ def list_experiments() -> List[Dict[str, Any]]:
         except Exception:
             pass
 
-    con = sqlite3.connect(SQLITE_PATH)
-    cur = con.cursor()
-    rows = cur.execute("SELECT id, name, reactor, started_at_utc FROM experiments ORDER BY id DESC").fetchall()
-    con.close()
+    con = _sqlite_conn(SQLITE_PATH)
+    rows = con.execute("SELECT id, name, reactor, started_at_utc FROM experiments ORDER BY id DESC").fetchall()
     return [{"id": r[0], "name": r[1], "reactor": r[2], "started_at_utc": r[3]} for r in rows]
 
 
 def list_tags(experiment_id: int) -> List[str]:
+    # experiment_tags is a point read of a few rows; experiments logged before it existed
+    # fall back to DISTINCT over samples
     if HAS_PSYCOPG:
         try:
-            with get_pg_conn() as conn:
+            with _pg_conn() as conn:
                 cur = conn.cursor()
-                cur.execute("SELECT DISTINCT tag FROM samples WHERE experiment_id = %s ORDER BY tag", (experiment_id,))
-                return [r[0] for r in cur.fetchall()]
+                cur.execute("SELECT tag FROM experiment_tags WHERE experiment_id = %s ORDER BY tag", (experiment_id,))
+                tags = [t for (t,) in cur]
+                if tags:
+                    return tags
+                cur.execute(
+                    "SELECT DISTINCT tag FROM samples WHERE experiment_id = %s AND tag IS NOT NULL ORDER BY tag",
+                    (experiment_id,),
+                )
+                return [t for (t,) in cur]
         except Exception:
             pass
 
-    con = sqlite3.connect(SQLITE_PATH)
-    rows = con.execute("SELECT DISTINCT tag FROM samples WHERE experiment_id = ? ORDER BY tag", (experiment_id,)).fetchall()
-    con.close()
-    return [r[0] for r in rows]
+    con = _sqlite_conn(SQLITE_PATH)
+    tags = [t for (t,) in con.execute("SELECT tag FROM experiment_tags WHERE experiment_id = ? ORDER BY tag", (experiment_id,))]
+    if tags:
+        return tags
+    cur = con.execute(
+        "SELECT DISTINCT tag FROM samples WHERE experiment_id = ? AND tag IS NOT NULL ORDER BY tag", (experiment_id,)
+    )
+    return [t for (t,) in cur]
 
 
-def load_timeseries(experiment_id: int, tags: List[str], minutes: int):
+def load_timeseries(experiment_id: int, tags: List[str], minutes: int, bucket_seconds: int = 0, limit: int = 0):
+    """
+    Samples for `tags` over the last `minutes`, as a DataFrame (ts_utc, tag, value).
+    With bucket_seconds > 0 the rows are averaged per (time bucket, tag) in SQL, so the
+    number of rows returned is bounded by the window size rather than the sample rate.
+    With limit > 0 only the newest `limit` rows are fetched (newest-first in SQL, so the
+    descending ts index stops early), then returned in ascending order like the rest.
+    """
+    import numpy as np
     import pandas as pd
 
     if not tags:
         return pd.DataFrame(columns=["ts_utc", "tag", "value"])
+    tags = list(tags)
 
+    bucket = int(bucket_seconds or 0)
     cutoff = datetime.now(timezone.utc) - timedelta(minutes=int(minutes))
-    placeholders = ",".join(["%s"] * len(tags)) if HAS_PSYCOPG else ",".join(["?"] * len(tags))
-    params = [experiment_id, cutoff.isoformat()] + tags
+    if bucket > 0:
+        # start on a bucket boundary: the oldest bucket is then complete and identical across
+        # calls, instead of a partial average that shifts every refresh
+        cutoff = datetime.fromtimestamp(cutoff.timestamp() // bucket * bucket, timezone.utc)
+    limit = int(limit or 0)
+    order_col = "1" if bucket > 0 else "ts_utc"
+    order = f"ORDER BY {order_col} DESC LIMIT {limit}" if limit > 0 else f"ORDER BY {order_col} ASC"
+
+    def _frame(rows, **ts_parse):
+        # (ts_utc, tag, value) tuples straight from the cursor, one array per column;
+        # cheaper than read_sql_query's per-row type inference
+        ts, tag, value = zip(*rows) if rows else ((), (), ())
+        return pd.DataFrame({
+            "ts_utc": pd.to_datetime(np.asarray(ts), **ts_parse),
+            "tag": np.asarray(tag, dtype=object),
+            "value": np.asarray(value, dtype=np.float32),
+        })
+
+    def _finish(df):
+        # requested tags are the fixed categories, so downstream isin/groupby run on int codes
+        df["tag"] = pd.Categorical(df["tag"], categories=list(dict.fromkeys(tags)))
+        # sensor values carry ~7 significant digits; float32 halves the frame and the chart payload
+        df["value"] = df["value"].astype(np.float32, copy=False)
+        return df.iloc[::-1].reset_index(drop=True) if limit > 0 else df
 
     if HAS_PSYCOPG:
+        # one array parameter keeps the SQL text identical whatever the number of tags
+        tag_filter = "tag = ANY(%s)"
+        if bucket > 0:
+            query = f"""
+                SELECT to_timestamp(floor(extract(epoch FROM ts_utc) / %s) * %s) AS ts_utc, tag, AVG(value) AS value
+                FROM samples
+                WHERE experiment_id = %s AND ts_utc >= %s AND {tag_filter}
+                GROUP BY 1, tag
+                {order}
+            """
+            params = [bucket, bucket, experiment_id, cutoff, tags]
+        else:
+            query = f"""
+                SELECT ts_utc, tag, value FROM samples
+                WHERE experiment_id = %s AND ts_utc >= %s AND {tag_filter}
+                {order}
+            """
+            params = [experiment_id, cutoff, tags]
+        if HAS_CONNECTORX and PG_DSN:
+            try:
+                df = _cx_read_pg(query, params)
+                df["ts_utc"] = pd.to_datetime(df["ts_utc"], utc=True)
+                return _finish(df)
+            except Exception:
+                pass
+        try:
+            with _pg_conn() as conn:
+                rows = conn.execute(query, params).fetchall()
+            return _finish(_frame(rows, utc=True))
+        except Exception:
+            pass
+
+    # sqlite fallback; tags travel as one JSON array so the statement cache hits on every call
+    epoch = _sqlite_epoch_ts(SQLITE_PATH)
+    tag_filter = "tag IN (SELECT value FROM json_each(?))"
+    if bucket > 0:
+        if epoch:
+            ts_expr, step, unit = "(ts_utc / ?) * ?", bucket * 1000, "ms"
+        else:
+            ts_expr, step, unit = "(CAST(strftime('%s', ts_utc) AS INTEGER) / ?) * ?", bucket, "s"
+        query = f"""
+            SELECT {ts_expr} AS ts_utc, tag, AVG(value) AS value
+            FROM samples
+            WHERE experiment_id = ? AND ts_utc >= ? AND {tag_filter}
+            GROUP BY 1, tag
+            {order}
+        """
+        params = [step, step, experiment_id, _sqlite_ts(cutoff), json.dumps(tags)]
+        ts_parse = {"unit": unit, "utc": True}
+    else:
         query = f"""
             SELECT ts_utc, tag, value FROM samples
-            WHERE experiment_id = %s AND ts_utc >= %s AND tag IN ({placeholders})
-            ORDER BY ts_utc ASC
+            WHERE experiment_id = ? AND ts_utc >= ? AND {tag_filter}
+            {order}
         """
+        params = [experiment_id, _sqlite_ts(cutoff), json.dumps(tags)]
+        ts_parse = {"unit": "ms", "utc": True} if epoch else {"utc": True, "errors": "coerce"}
+
+    df = None
+    if HAS_CONNECTORX:
         try:
-            with get_pg_conn() as conn:
-                df = pd.read_sql_query(query, conn, params=params)
-                df["ts_utc"] = pd.to_datetime(df["ts_utc"], utc=True)
-                return df
+            df = _cx_read_sqlite(query, params)
+            df["ts_utc"] = pd.to_datetime(df["ts_utc"], **ts_parse)
         except Exception:
-            pass
-
-    # sqlite fallback
-    query = f"""
-        SELECT ts_utc, tag, value FROM samples
-        WHERE experiment_id = ? AND ts_utc >= ? AND tag IN ({placeholders})
-        ORDER BY ts_utc ASC
-    """
-    con = sqlite3.connect(SQLITE_PATH)
-    df = pd.read_sql_query(query, con, params=params)
-    con.close()
-    if df.empty:
-        return df
-    df["ts_utc"] = pd.to_datetime(df["ts_utc"], errors="coerce", utc=True)
-    df = df.dropna(subset=["ts_utc"])
-    return df
+            # e.g. connectorx cannot infer column types on an empty result
+            df = None
+    if df is None:
+        rows = _sqlite_conn(SQLITE_PATH).execute(query, params).fetchall()
+        df = _frame(rows, **ts_parse)
+    if not epoch:
+        # legacy ISO-text rows that failed to parse
+        df = df.dropna(subset=["ts_utc"])
+    return _finish(df)
 
 
 def list_calibrations(reactor: Optional[str] = None, sensor: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
     if HAS_PSYCOPG:
         try:
-            with get_pg_conn() as conn:
+            with _pg_conn() as conn:
                 cur = conn.cursor()
                 q = "SELECT id, ts_utc, reactor, sensor, cp, point, value, status, quality, returned_value, method_nodeid FROM calibrations"
                 conds = []
@@ -355,8 +737,7 @@ def list_calibrations(reactor: Optional[str] = None, sensor: Optional[str] = Non
         except Exception:
             pass
 
-    con = sqlite3.connect(SQLITE_PATH)
-    cur = con.cursor()
+    con = _sqlite_conn(SQLITE_PATH)
     q = "SELECT id, ts_utc, reactor, sensor, cp, point, value, status, quality, returned_value, method_nodeid FROM calibrations"
     conds = []
     params = []
@@ -368,8 +749,7 @@ def list_calibrations(reactor: Optional[str] = None, sensor: Optional[str] = Non
         q += " WHERE " + " AND ".join(conds)
     q += " ORDER BY ts_utc DESC LIMIT ?"
     params.append(limit)
-    rows = cur.execute(q, params).fetchall()
-    con.close()
+    rows = con.execute(q, params).fetchall()
     out = []
     for r in rows:
         out.append({
@@ -385,4 +765,14 @@ def list_calibrations(reactor: Optional[str] = None, sensor: Optional[str] = Non
             "returned_value": r[9],
             "method_nodeid": r[10],
         })
-    return out
\ No newline at end of file
+    return out
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["migrate-sqlite"]:
+        _ensure_sqlite()
+        print("migrated" if migrate_sqlite_samples() else "already in the current layout")
+    else:
+        print("usage: python db_pg.py migrate-sqlite")
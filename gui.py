@@ -1,7 +1,9 @@
 # gui.py  (Stage 2 updated — selectable biomass channels)
+import numpy as np
 import pandas as pd
 import streamlit as st
 import datetime
+import threading
 import db_pg
 
 st.set_page_config(page_title="Stage 2 — Reactors Dashboard (Select Channels)", layout="wide")
@@ -10,46 +12,118 @@ st.title("Stage 2 — Reactors Dashboard (Select biomass channels)")
 # Ensure DB tables exist
 db_pg.ensure_db()
 
+@st.cache_resource
+def _shared_conn():
+    # one autocommit connection for every rerun and session of this process
+    conn = db_pg.get_pg_conn()
+    conn.autocommit = True
+    return conn
+
 def get_conn():
-    return db_pg.get_pg_conn()
+    conn = _shared_conn()
+    if conn.closed or conn.broken:
+        _shared_conn.clear()
+        conn = _shared_conn()
+    return conn
+
+# st.line_chart can't show more than this many points per channel meaningfully;
+# windows over DOWNSAMPLE_AFTER_MIN are averaged into time buckets in SQL to stay under it
+MAX_POINTS_PER_TAG = 2000
+DOWNSAMPLE_AFTER_MIN = 30
+
+def _sql_ident(name: str) -> str:
+    # column alias for a tag: double-quoted, with % doubled for psycopg's placeholder parser
+    return '"' + name.replace('"', '""').replace("%", "%%") + '"'
+
+def _fast_read(conn, q: str, params: tuple, columns: tuple) -> pd.DataFrame:
+    """
+    Run `q` once and build the frame straight from the rows: first column is the ts_utc
+    index, the rest become float32 `columns` (NULL -> NaN). Skips read_sql_query's
+    per-cell object pass, which dominates on the time-series reads.
+    """
+    with conn.cursor() as cur:
+        cur.execute(q, params)
+        rows = cur.fetchall()
+    ts = pd.DatetimeIndex(pd.to_datetime([r[0] for r in rows], utc=True), name="ts_utc")
+    vals = np.array([r[1:] for r in rows], dtype=np.float32).reshape(len(rows), len(columns))
+    return pd.DataFrame(vals, index=ts, columns=list(columns))
+
+def _query_wide(reactor: str, tags: tuple, since, bucket: int = 0):
+    """
+    One column per tag, indexed by ts_utc (UTC), pivoted in SQL with conditional aggregation
+    (one query instead of one per tag plus a pandas outer join). With bucket > 0 rows are
+    averaged per `bucket`-second time bucket.
+    """
+    conn = get_conn()
+    cols = ", ".join(f"AVG(CASE WHEN s.tag = %s THEN s.value END) AS {_sql_ident(t)}" for t in tags)
+    if bucket:
+        ts_expr = "to_timestamp(floor(extract(epoch FROM s.ts_utc) / %s) * %s)"
+        ts_params = (bucket, bucket)
+    else:
+        ts_expr, ts_params = "s.ts_utc", ()
+    q = f"""
+    SELECT {ts_expr} AS ts_utc, {cols}
+    FROM samples s
+    JOIN experiments e ON s.experiment_id = e.id
+    WHERE e.reactor = %s AND s.tag = ANY(%s) AND s.ts_utc >= %s AND s.value IS NOT NULL
+    GROUP BY 1
+    ORDER BY 1 ASC
+    """
+    # float32 halves what st.line_chart serializes to the browser each rerun
+    return _fast_read(conn, q, (*ts_params, *tags, reactor, list(tags), since), tags)
+
+@st.cache_resource
+def _wide_frames() -> dict:
+    # (reactor, tags, minutes) -> wide frame of the current window, shared across reruns
+    # and sessions (each session is its own thread), so updates go through the lock
+    return {"lock": threading.Lock(), "frames": {}}
+
+def load_recent_wide(reactor: str, tags: tuple, minutes: int):
+    """
+    Wide frame for the last `minutes`. Long windows come back as time-bucket averages
+    (at most MAX_POINTS_PER_TAG rows). Short raw windows are kept and topped up with only
+    the rows since the last timestamp already held, instead of re-reading the whole window.
+    """
+    if minutes > DOWNSAMPLE_AFTER_MIN:
+        return _load_bucketed(reactor, tags, minutes, max(1, minutes * 60 // MAX_POINTS_PER_TAG))
+
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=minutes)
+    shared = _wide_frames()
+    key = (reactor, tags, minutes)
+    with shared["lock"]:
+        frames = shared["frames"]
+        old = frames.get(key)
+        if old is None or old.empty:
+            df = _query_wide(reactor, tags, since)
+        else:
+            # re-read the last timestamp too: the sampler may have added more tags to it since
+            last = old.index[-1]
+            df = pd.concat([old.loc[old.index < last], _query_wide(reactor, tags, last.to_pydatetime())])
+        df = df.loc[df.index >= pd.Timestamp(since)]
+        if len(frames) > 32:
+            frames.clear()
+        frames[key] = df
+    return df
 
 @st.cache_data(ttl=2)
-def load_recent(reactor: str, tag: str, minutes: int):
-    conn = get_conn()
-    try:
-        since = (datetime.datetime.utcnow() - datetime.timedelta(minutes=minutes)).isoformat()
-        q = """
-        SELECT s.ts_utc, s.value
-        FROM samples s
-        JOIN experiments e ON s.experiment_id = e.id
-        WHERE e.reactor = %s AND s.tag = %s AND s.ts_utc >= %s
-        ORDER BY s.ts_utc ASC
-        """
-        df = pd.read_sql_query(q, conn, params=(reactor, tag, since))
-        if len(df) == 0:
-            return df
-        df["ts_utc"] = pd.to_datetime(df["ts_utc"])
-        df = df.set_index("ts_utc")
-        return df
-    finally:
-        conn.close()
+def _load_bucketed(reactor: str, tags: tuple, minutes: int, bucket: int):
+    # floored to a bucket boundary so the oldest bucket is complete, not a shifting partial
+    since = (pd.Timestamp.now(tz="UTC") - pd.Timedelta(minutes=minutes)).floor(f"{bucket}s")
+    return _query_wide(reactor, tags, since, bucket)
 
 @st.cache_data(ttl=2)
 def list_available_tags(reactor: str, limit=1000):
     conn = get_conn()
-    try:
-        q = """
-        SELECT DISTINCT s.tag
-        FROM samples s
-        JOIN experiments e ON s.experiment_id = e.id
-        WHERE e.reactor = %s
-        ORDER BY s.tag ASC
-        LIMIT %s
-        """
-        df = pd.read_sql_query(q, conn, params=(reactor, limit))
-        return df["tag"].tolist()
-    finally:
-        conn.close()
+    q = """
+    SELECT DISTINCT s.tag
+    FROM samples s
+    JOIN experiments e ON s.experiment_id = e.id
+    WHERE e.reactor = %s
+    ORDER BY s.tag ASC
+    LIMIT %s
+    """
+    df = pd.read_sql_query(q, conn, params=(reactor, limit))
+    return df["tag"].tolist()
 
 # Sidebar controls
 with st.sidebar:
@@ -66,7 +140,8 @@ default_biomass = [
     "biomass_590","biomass_630","biomass_680","biomass_clear","biomass_nir"
 ]
 # intersection of available tags and defaults, for sensible defaults
-default_selection = [t for t in default_biomass if t in available_tags]
+available_set = set(available_tags)
+default_selection = [t for t in default_biomass if t in available_set]
 if not default_selection:
     # if DB doesn't yet have biomass tags, fall back to available tags
     default_selection = available_tags[:3] if available_tags else []
@@ -78,23 +153,31 @@ if not selected:
     st.stop()
 
 # Latest metrics: read the most recent value per tag for quick glance
-def load_latest_value(conn, reactor, tag):
+@st.cache_data(ttl=2)
+def load_latest_values(reactor, tags):
+    """
+    {tag: newest value} for every tag in `tags` (None where the tag has no samples), in one
+    statement: a LATERAL newest-row lookup per tag instead of one query per metric card.
+    """
     q = """
-    SELECT s.ts_utc, s.value FROM samples s
-    JOIN experiments e ON s.experiment_id = e.id
-    WHERE e.reactor = %s AND s.tag = %s
-    ORDER BY s.ts_utc DESC LIMIT 1
+    SELECT t.tag, l.value
+    FROM unnest(%s::text[]) AS t(tag)
+    LEFT JOIN LATERAL (
+        SELECT s.value FROM samples s
+        JOIN experiments e ON s.experiment_id = e.id
+        WHERE e.reactor = %s AND s.tag = t.tag
+        ORDER BY s.ts_utc DESC LIMIT 1
+    ) l ON true
     """
-    df = pd.read_sql_query(q, conn, params=(reactor, tag))
-    if df.empty:
-        return None
-    return float(df.iloc[0]["value"])
+    with get_conn().cursor() as cur:
+        cur.execute(q, (list(tags), reactor))
+        return {tag: (None if value is None else float(value)) for tag, value in cur.fetchall()}
 
-conn = get_conn()
-try:
-    latest_vals = {tag: load_latest_value(conn, reactor, tag) for tag in ["ph_pH","do_ppm"] + selected}
-finally:
-    conn.close()
+# pH / DO / selected channels and the logged actuator parameters, all in one round-trip
+tags_act = ["pwm0_setpoint","pwm0_lb","pwm0_ub"]
+# tags the reactor has never logged can't have a latest value; they show "—" without a lookup
+wanted = [t for t in dict.fromkeys(["ph_pH","do_ppm"] + selected + tags_act) if t in available_set]
+latest_vals = load_latest_values(reactor, wanted) if wanted else {}
 
 # display top metrics (pH / DO + first selected)
 m1, m2, m3 = st.columns(3)
@@ -105,61 +188,36 @@ m3.metric(f"{reactor} {first_sel}", "—" if latest_vals.get(first_sel) is None
 
 st.divider()
 
-# Build combined DataFrame for selected channels
-dfs = []
-for tag in selected:
-    df_tag = load_recent(reactor, tag, window_min)
-    if df_tag.empty:
-        continue
-    df_tag = df_tag.rename(columns={"value": tag})
-    dfs.append(df_tag)
+# Combined DataFrame for selected channels, already wide and sorted
+combined = load_recent_wide(reactor, tuple(selected), window_min)
 
-if not dfs:
+if combined.empty:
     st.info("No data available for the selected channels in the chosen time window.")
 else:
-    # join on timestamp (outer), then plot
-    combined = pd.concat(dfs, axis=1)
-    combined = combined.dropna(how="all")
-    if combined.empty:
-        st.info("Data present but after aligning timestamps nothing remained (try a larger time window).")
-    else:
-        st.subheader(f"{reactor} — Selected biomass channels (last {window_min} min)")
-        st.line_chart(combined)
+    # every row comes from a selected tag, so there are no all-NaN timestamps to drop
+    st.subheader(f"{reactor} — Selected biomass channels (last {window_min} min)")
+    st.line_chart(combined)
 
 st.divider()
 st.subheader("Latest actuator parameters (logged)")
-# load latest actuator values
-conn = get_conn()
-try:
-    tags_act = ["pwm0_setpoint","pwm0_lb","pwm0_ub"]
-    latest_act = {}
-    for t in tags_act:
-        r = pd.read_sql_query("""
-            SELECT s.value FROM samples s
-            JOIN experiments e ON s.experiment_id = e.id
-            WHERE e.reactor=%s AND s.tag=%s ORDER BY s.ts_utc DESC LIMIT 1
-        """, conn, params=(reactor,t))
-        latest_act[t] = None if r.empty else float(r.iloc[0]["value"])
-finally:
-    conn.close()
+latest_act = {t: latest_vals.get(t) for t in tags_act}
 
 a1, a2, a3 = st.columns(3)
 a1.metric("Setpoint", "—" if latest_act["pwm0_setpoint"] is None else f"{latest_act['pwm0_setpoint']:.3f}")
 a2.metric("LB", "—" if latest_act["pwm0_lb"] is None else f"{latest_act['pwm0_lb']:.3f}")
 a3.metric("UB", "—" if latest_act["pwm0_ub"] is None else f"{latest_act['pwm0_ub']:.3f}")
 
+@st.cache_data(ttl=1)
+def load_raw_rows(reactor, limit=500):
+    q = """
+    SELECT s.ts_utc, s.tag, s.nodeid, s.value
+    FROM samples s
+    JOIN experiments e ON s.experiment_id = e.id
+    WHERE e.reactor = %s
+    ORDER BY s.ts_utc DESC
+    LIMIT %s
+    """
+    return pd.read_sql_query(q, get_conn(), params=(reactor, limit))
+
 with st.expander("Raw recent rows for reactor"):
-    conn = get_conn()
-    try:
-        q = """
-        SELECT s.ts_utc, s.tag, s.nodeid, s.value
-        FROM samples s
-        JOIN experiments e ON s.experiment_id = e.id
-        WHERE e.reactor = %s
-        ORDER BY s.ts_utc DESC
-        LIMIT 500
-        """
-        df = pd.read_sql_query(q, conn, params=(reactor,))
-        st.dataframe(df)
-    finally:
-        conn.close()
\ No newline at end of file
+    st.dataframe(load_raw_rows(reactor))
@@ -1,13 +1,19 @@
 # opc_worker.py
 import asyncio
+import itertools
 import threading
 import traceback
 from dataclasses import dataclass
 from queue import Queue, Empty
-from typing import Any, Dict, Optional
+from types import MappingProxyType
+from typing import Any, Dict, Optional, Tuple
 
 from client import ReactorOpcClient
 
+# one epoch per OpcWorker instance in this process, so versions from a worker that was
+# stopped and replaced never match the new worker's counter
+_EPOCHS = itertools.count(1)
+
 
 @dataclass
 class Request:
@@ -29,6 +35,57 @@ class OpcWorker:
         self.latest_values: Dict[str, Any] = {}
         self.mappings: Dict[str, Any] = {}
 
+        # bumped whenever latest_values changes, so the UI can skip unchanged snapshots
+        self._lock = threading.Lock()
+        self._epoch = next(_EPOCHS)
+        self._version = 0
+        # read-only copy of latest_values, rebuilt only when the version has moved on
+        self._snapshot = MappingProxyType({})
+        self._snapshot_version = 0
+        # nodeid -> version of its last change, kept in change order (oldest first)
+        self._changed_at: Dict[str, int] = {}
+
+    @property
+    def version(self) -> Tuple[int, int]:
+        """(worker epoch, change counter); compare whole, never the counter alone."""
+        with self._lock:
+            return self._epoch, self._version
+
+    def snapshot_view(self):
+        """Return (read-only mapping of latest values, version); no copy if nothing changed."""
+        with self._lock:
+            if self._snapshot_version != self._version:
+                self._snapshot = MappingProxyType(dict(self.latest_values))
+                self._snapshot_version = self._version
+            return self._snapshot, (self._epoch, self._snapshot_version)
+
+    def changes_since(self, version: Optional[Tuple[int, int]]):
+        """
+        Return ({nodeid: value} changed after `version`, current version), walking only the
+        changed tail of the log. The mapping is None when `version` is unknown to this worker
+        (None, or issued by another worker before a restart); callers then take a full
+        snapshot_view().
+        """
+        with self._lock:
+            current = (self._epoch, self._version)
+            if not isinstance(version, tuple) or version[0] != self._epoch or version[1] > self._version:
+                return None, current
+            changes = {}
+            for nid, v in reversed(self._changed_at.items()):
+                if v <= version[1]:
+                    break
+                changes[nid] = self.latest_values[nid]
+            return changes, current
+
+    def _update_values(self, values: Dict[str, Any]):
+        with self._lock:
+            self.latest_values.update(values)
+            self._version += 1
+            for nid in values:
+                # re-insert so the dict stays ordered by last change
+                self._changed_at.pop(nid, None)
+                self._changed_at[nid] = self._version
+
     def start(self):
         if self._thread and self._thread.is_alive():
             return
@@ -70,22 +127,41 @@ class OpcWorker:
                 break
 
             try:
-                if req.kind == "connect_browse":
-                    res = await self._connect_browse(req.endpoint)
-                    self._reply(req, res)
-                elif req.kind in ("read_snapshot", "read_all"):
-                    self._reply(req, {"ok": True, "data": dict(self.latest_values)})
-                elif req.kind == "write":
-                    res = await self._write(req.payload or {})
-                    self._reply(req, res)
-                elif req.kind == "call":
-                    res = await self._call(req.payload)
-                    self._reply(req, res)
+                if req.kind == "bulk":
+                    res = await self._bulk(req)
                 else:
-                    self._reply(req, {"ok": False, "error": f"unknown kind: {req.kind}"})
+                    res = await self._dispatch(req.kind, req.endpoint, req.payload)
+                self._reply(req, res)
             except Exception as e:
                 self._reply(req, {"ok": False, "error": f"{e}\n{traceback.format_exc()}"})
 
+    async def _dispatch(self, kind: str, endpoint: str, payload: Any) -> dict:
+        if kind == "connect_browse":
+            return await self._connect_browse(endpoint)
+        if kind in ("read_snapshot", "read_all"):
+            data, version = self.snapshot_view()
+            return {"ok": True, "data": data, "version": version}
+        if kind == "write":
+            return await self._write(payload or {})
+        if kind == "call":
+            return await self._call(payload)
+        return {"ok": False, "error": f"unknown kind: {kind}"}
+
+    async def _bulk(self, req: Request) -> dict:
+        """
+        Run several ops in one round-trip: payload={"ops": ["connect_browse", "read_snapshot"]}.
+        Reply: {"ok": all ops ok, "data": {op: result}}; stops at the first failing op.
+        """
+        payload = req.payload if isinstance(req.payload, dict) else {}
+        ops = payload.get("ops") or []
+        out: Dict[str, Any] = {}
+        for op in ops:
+            res = await self._dispatch(op, req.endpoint, None)
+            out[op] = res
+            if not res.get("ok"):
+                return {"ok": False, "error": f"{op}: {res.get('error')}", "data": out}
+        return {"ok": True, "data": out}
+
     def _reply(self, req: Request, res: dict):
         try:
             if req.reply_q:
@@ -105,7 +181,7 @@ class OpcWorker:
         self.client = ReactorOpcClient(endpoint=endpoint)
 
         def on_change(nodeid: str, value: Any):
-            self.latest_values[nodeid] = value
+            self._update_values({nodeid: value})
 
         await self.client.connect()
         # browse_address_space already executed inside connect(), but call again to be explicit
@@ -115,7 +191,7 @@ class OpcWorker:
         await self.client.init_subscriptions(on_change=on_change)
 
         # Prime latest_values with current snapshot
-        self.latest_values.update(await self.client.read_snapshot())
+        self._update_values(self.client.read_snapshot())
 
         return {"ok": True, "mappings": self.mappings}
 
@@ -123,7 +199,7 @@ class OpcWorker:
         if not self.client:
             return {"ok": False, "error": "not connected"}
         await self.client.write_bulk(writes)
-        self.latest_values.update(writes)
+        self._update_values(writes)
         return {"ok": True, "data": writes}
 
     async def _call(self, payload):
@@ -1,6 +1,8 @@
 # sampler.py
 import asyncio
+import logging
 import sys
+import time
 from datetime import datetime, timezone
 
 from client import ReactorOpcClient
@@ -14,6 +16,20 @@ def _tag(info: dict) -> str:
     return f"{info.get('reactor','')}:{info.get('name','')}:{info.get('channel','')}".strip(":")
 
 
+async def _sleep_flushing(writer: db_pg.SampleWriter, seconds: float):
+    # asyncio.sleep(seconds), waking to write the buffer as soon as its oldest row is
+    # max_age_s old, so a slow poll doesn't hold rows in memory for a whole interval
+    end = time.monotonic() + seconds
+    while True:
+        await asyncio.sleep(max(0.0, min(end, writer.due_at()) - time.monotonic()))
+        try:
+            writer.flush_if_due()
+        except Exception:
+            pass
+        if time.monotonic() >= end:
+            return
+
+
 async def main(poll_s: float):
     dbtype = db_pg.ensure_db()
     print(f"[sampler] DB type: {dbtype}")
@@ -38,34 +54,53 @@ async def main(poll_s: float):
         exp_ids[r] = exp_id
         print(f"✅ Reactor: {r} -> experiment {exp_id}")
 
+    # (experiment id, nodeid, tag) per logged sensor, resolved once instead of per tick
+    targets = [
+        (exp_ids[info.get("reactor")], nid, _tag(info))
+        for nid, info in sensor_vars.items()
+        if isinstance(info, dict) and info.get("reactor") in exp_ids
+    ]
+    nodeids = [nid for _, nid, _ in targets]
+
     print(f"✅ Sampler connected to {ENDPOINT}")
     print(f"✅ Logging to DB for reactors: {', '.join(reactors)}")
     print(f"⏱️ Interval: {poll_s}s (Ctrl+C to stop)")
 
+    # ticks are coalesced: rows are committed at most 1 s after they were read (or per
+    # 1000 rows); with polls of 1 s or slower that is one commit per tick
+    writer = db_pg.SampleWriter(max_rows=1000, max_age_s=1.0)
     try:
         while True:
-            ts = datetime.now(timezone.utc).isoformat()
-
-            for nid, info in sensor_vars.items():
-                if not isinstance(info, dict):
-                    continue
-                reactor = info.get("reactor")
-                if reactor not in exp_ids:
-                    continue
-                try:
-                    node = client.client.get_node(nid)
-                    v = await node.read_value()
-                    if isinstance(v, (int, float)):
-                        db_pg.insert_sample(exp_ids[reactor], ts, nid, _tag(info), float(v))
-                except Exception:
-                    pass
-
-            await asyncio.sleep(poll_s)
+            # one timestamp per tick; db_pg stores it natively (TIMESTAMPTZ / epoch ms)
+            ts = datetime.now(timezone.utc)
+
+            # all sensors in one Read request per tick
+            try:
+                values = await client.read_many(nodeids)
+            except Exception:
+                values = []
+
+            rows = [
+                (exp_id, ts, nid, tag, float(v))
+                for (exp_id, nid, tag), v in zip(targets, values)
+                if isinstance(v, (int, float))
+            ]
+            try:
+                writer.extend(rows)
+            except Exception:
+                pass
+
+            await _sleep_flushing(writer, poll_s)
     finally:
+        try:
+            writer.flush()
+        except Exception:
+            pass
         await client.disconnect()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     poll = POLL_DEFAULT
     if len(sys.argv) > 1:
         poll = float(sys.argv[1])